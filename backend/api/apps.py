@@ -6,3 +6,7 @@ class ApiConfig(AppConfig):
     """Настройки приложения api."""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        """Подключает обработчики сигналов приложения."""
+        from . import signals  # noqa: F401
@@ -1,23 +1,142 @@
 """Содержит фильтры, используемые приложением api."""
+from functools import reduce
+from operator import or_
 import re
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    BooleanField, Case, Count, Exists, F, FloatField, OuterRef, Subquery,
+    Value, When,
+)
+from django.db.models.functions import Cast
 import django_filters.rest_framework as dj_filters
 from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient
+from recipes.constants import RECIPES_ORDERING
+from core.versions import get_version
+from recipes.models import Ingredient, IngredientOccurence, Recipe, Tag
+from recipes.search import search_recipes
 
 
 class IngredientFilterSet(dj_filters.FilterSet):
-    """Фильтр для модели Ingredient."""
-    name = dj_filters.CharFilter(field_name='name', lookup_expr='istartswith')
+    """Фильтр для модели Ingredient. Выдаёт ингредиенты, в названии
+    которых встречается заданная строка: сначала те, название которых с неё
+    начинается, затем остальные. Даёт те же результаты, что и
+    api.ingredient_index.IngredientIndex.
+    """
+    name = dj_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        """Выполняет фильтрацию по названию ингредиента."""
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix_match=Case(
+                When(name__istartswith=value, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        ).order_by('-is_prefix_match', 'name', 'id')
+
+
+def get_ids(query_params, name):
+    """Возвращает список id, заданных в строке запроса повторяющимся
+    параметром с заданным именем, или None, если какой-либо из них
+    некорректен.
+    """
+    values = query_params.getlist(name)
+    if not all(re.fullmatch(r'\d+', value) for value in values):
+        return None
+
+    return sorted(set(map(int, values)))
+
+
+def occurences(**filters):
+    """Возвращает кверисет вхождений ингредиентов в рецепт, на который
+    ссылается внешний запрос.
+    """
+    return IngredientOccurence.objects.filter(
+        recipe=OuterRef('pk'), **filters
+    ).order_by()
+
+
+def count_occurences(**filters):
+    """Возвращает выражение, подсчитывающее вхождения ингредиентов в
+    рецепт, на который ссылается внешний запрос.
+    """
+    return Cast(
+        Subquery(
+            occurences(**filters).values('recipe').annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        FloatField()
+    )
+
+
+def filter_pantry(queryset, ingredient_ids):
+    """Отбирает рецепты, содержащие хотя бы один из заданных ингредиентов,
+    и упорядочивает их по убыванию доли ингредиентов рецепта, входящих в
+    заданный набор (аннотация pantry_match).
+    """
+    return queryset.filter(
+        pk__in=IngredientOccurence.objects.filter(
+            ingredient__in=ingredient_ids
+        ).values('recipe')
+    ).annotate(
+        pantry_match=(
+            count_occurences(ingredient__in=ingredient_ids)
+            / count_occurences()
+        )
+    ).order_by('-pantry_match', *RECIPES_ORDERING)
+
+
+def get_tag_ids():
+    """Возвращает словарь {slug: id} всех тегов. Словарь кэшируется до
+    изменения данных тегов.
+    """
+    return cache.get_or_set(
+        f'tag_ids:{get_version(Tag)}',
+        lambda: dict(Tag.objects.values_list('slug', 'pk')),
+        settings.TAG_IDS_CACHE_TIMEOUT
+    )
+
+
+def filter_tags(queryset, slugs):
+    """Отбирает рецепты, отмеченные хотя бы одним из тегов с заданными
+    slug. Если все теги представлены в битовой маске тегов рецепта и
+    включена настройка RECIPE_TAGS_MASK, проверяется маска; иначе -
+    подзапрос EXISTS по таблице связи рецептов с тегами.
+    """
+    tag_ids = [pk for slug, pk in get_tag_ids().items() if slug in slugs]
+    if not tag_ids:
+        return queryset.none()
+
+    bits = [Tag.get_bit(pk) for pk in tag_ids]
+    if settings.RECIPE_TAGS_MASK and all(bits):
+        return queryset.alias(
+            tags_match=F('tags_mask').bitand(reduce(or_, bits))
+        ).exclude(tags_match=0)
+
+    return queryset.filter(Exists(
+        Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=tag_ids
+        )
+    ))
+
 
 class RecipeFilterBackend(BaseFilterBackend):
-    """Реализует фильтрацию рецептов."""
+    """Реализует фильтрацию рецептов. Условия на ингредиенты (параметры
+    ingredients - обязательные ингредиенты и exclude_ingredients -
+    недопустимые) и на теги проверяются подзапросами EXISTS или по битовой
+    маске, без соединения со связанными таблицами и DISTINCT. Фильтрация
+    по тегам не выполняется, если атрибут filter_by_tags обработчика равен
+    False. Параметр search задаёт полнотекстовый поиск по названию и
+    описанию; найденные рецепты упорядочиваются по убыванию релевантности.
+    """
     def filter_queryset(self, request, queryset, view):
         if request.query_params.get('is_favorited', 0) == '1':
             if request.user.is_authenticated:
@@ -38,8 +157,42 @@ class RecipeFilterBackend(BaseFilterBackend):
             else:
                 queryset = queryset.none()
 
+        queryset = self.filter_ingredients(request, queryset)
         tags = request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+        if tags and getattr(view, 'filter_by_tags', True):
+            queryset = filter_tags(queryset, tags)
+
+        return self.filter_search(request, queryset)
+
+    @staticmethod
+    def filter_ingredients(request, queryset):
+        """Выполняет фильтрацию по обязательным и недопустимым
+        ингредиентам.
+        """
+        ingredients = get_ids(request.query_params, 'ingredients')
+        excluded = get_ids(request.query_params, 'exclude_ingredients')
+        if ingredients is None or excluded is None:
+            return queryset.none()
+
+        for ingredient_id in ingredients:
+            queryset = queryset.filter(
+                Exists(occurences(ingredient=ingredient_id))
+            )
+
+        if excluded:
+            queryset = queryset.exclude(
+                Exists(occurences(ingredient__in=excluded))
+            )
 
         return queryset
+
+    @staticmethod
+    def filter_search(request, queryset):
+        """Выполняет полнотекстовый поиск по названию и описанию."""
+        text = request.query_params.get('search', '').strip()
+        if not text:
+            return queryset
+
+        return search_recipes(queryset, text).order_by(
+            '-search_rank', *RECIPES_ORDERING
+        )
@@ -0,0 +1,104 @@
+"""Содержит индекс в памяти процесса, используемый для поиска ингредиентов
+по началу названия (автодополнение в редакторе рецептов).
+"""
+from bisect import bisect_left
+import sys
+from threading import Lock
+
+from core.versions import get_version
+from recipes.models import Ingredient
+
+MAX_CHAR = chr(sys.maxunicode)
+
+
+def fold(text):
+    """Приводит строку к виду, используемому для сравнения без учёта
+    регистра.
+    """
+    return text.casefold()
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов. Хранит отсортированный массив
+    приведённых к единому регистру названий, что позволяет находить
+    совпадения по началу названия двоичным поиском. Ингредиенты, в
+    названии которых запрос встречается не с начала, ищутся перебором и
+    выдаются после совпадений по началу.
+    """
+    def __init__(self):
+        """Создаёт пустой индекс. Индекс строится при первом обращении,
+        а также заново после вызова invalidate() или изменения версии
+        данных ингредиентов: так изменения, сделанные другими процессами,
+        становятся видны сразу и согласованно с ETag справочника, который
+        вычисляется по той же версии.
+        """
+        self.lock = Lock()
+        self.version = None
+        self.data = ((), (), (), ())
+
+    def invalidate(self):
+        """Помечает индекс как устаревший."""
+        self.version = None
+
+    def is_stale(self, version):
+        """Возвращает True, если индекс построен по версии данных
+        ингредиентов, более ранней, чем заданная.
+        """
+        return self.version is None or self.version < version
+
+    def build(self):
+        """Строит индекс по текущему содержимому таблицы ингредиентов.
+        Версия данных считывается до их загрузки, поэтому изменения,
+        сделанные во время построения, приведут к повторному построению.
+        """
+        version = get_version(Ingredient)
+        ingredients = tuple(Ingredient.objects.order_by('name', 'id'))
+        folded_names = tuple(
+            fold(ingredient.name) for ingredient in ingredients
+        )
+        entries = sorted(
+            (key, position) for position, key in enumerate(folded_names)
+        )
+        self.data = (
+            ingredients,
+            folded_names,
+            tuple(key for key, _ in entries),
+            tuple(position for _, position in entries),
+        )
+        self.version = version
+
+    def ensure_built(self):
+        """Строит индекс, если он отсутствует или устарел."""
+        version = get_version(Ingredient)
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    self.build()
+
+    def search(self, query, limit=None):
+        """Возвращает список ингредиентов, название которых содержит
+        строку query. Сначала идут ингредиенты, название которых с неё
+        начинается, затем остальные; внутри каждой группы - в порядке
+        названий. Размер списка ограничивается значением limit.
+        """
+        self.ensure_built()
+        ingredients, folded_names, keys, positions = self.data
+        query = fold(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + MAX_CHAR, start)
+
+        prefix_positions = sorted(positions[start:end])
+        result = [ingredients[position] for position in prefix_positions]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+
+        for ingredient, key in zip(ingredients, folded_names):
+            if query in key and not key.startswith(query):
+                result.append(ingredient)
+                if limit is not None and len(result) >= limit:
+                    break
+
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,35 +1,122 @@
 """Содержит сериализаторы, используемые приложением api."""
 from base64 import b64decode
+import binascii
 import re
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
+from django.db import models, transaction
 from djoser.serializers import (
     UserSerializer as DjoserUserSerializer,
     UserCreateSerializer as DjoserUserCreateSerializer,
     SetPasswordSerializer as DjoserSetPasswordSerializer,
 )
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
-from recipes.models import Tag, Ingredient, Recipe, IngredientOccurence
+from core.projections import project
+from recipes.constants import (
+    RECIPE_IMAGE_RENDITION_WIDTHS, RECIPE_IMAGE_THUMBNAIL_WIDTH
+)
+from recipes.models import (
+    Tag, Ingredient, Recipe, IngredientOccurence,
+    RecipeInFavorites, RecipeInShoppingCart,
+)
+from recipes.renditions import get_rendition_url, has_renditions
 import recipes.serializers
 from users.constants import MAX_PASSWORD_LENGTH
+from .subscriptions import SubscriptionCache
 
 
 IngredientSerializer = recipes.serializers.IngredientSerializer
 
 
-class UserSerializer(DjoserUserSerializer):
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit из строки запроса,
+    если он там есть. В противном случае - 0.
+    """
+    limit = request.query_params.get('recipes_limit', '')
+    return int(limit) if re.fullmatch(r'\d+', limit) else 0
+
+
+def split_names(values):
+    """Возвращает множество имён из списка строк с именами через запятую.
+    """
+    return {
+        name.strip() for value in values for name in value.split(',')
+    } - {''}
+
+
+def get_sparse_fields(request, names):
+    """Возвращает имена полей из names, выбранные клиентом параметрами
+    fields (нужные поля) и omit (ненужные поля) строки запроса. Выбор
+    полей учитывается только в запросах на чтение.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return tuple(names)
+
+    requested = split_names(request.query_params.getlist('fields'))
+    omitted = split_names(request.query_params.getlist('omit'))
+    return tuple(
+        name for name in names
+        if (not requested or name in requested) and name not in omitted
+    )
+
+
+class SparseFieldsetMixin:
+    """Примесь к сериализатору, оставляющая в ответе только поля,
+    выбранные клиентом (см. get_sparse_fields). Применяется к сериализатору
+    верхнего уровня: вложенные объекты представляются полностью.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.root
+        if root is not self and getattr(root, 'child', None) is not self:
+            return fields
+
+        return {
+            name: fields[name]
+            for name in get_sparse_fields(self.context.get('request'), fields)
+        }
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """Сериализатор для списка объектов модели User. Перед сериализацией
+    загружает одним запросом сведения о подписках клиента на всех
+    пользователей списка, если они входят в представление.
+    """
+    def to_representation(self, data):
+        users = list(
+            data.all() if isinstance(data, models.manager.BaseManager)
+            else data
+        )
+        if 'is_subscribed' in self.child.fields:
+            SubscriptionCache.for_request(self.context['request']).load(
+                user.pk for user in users
+                if not hasattr(user, 'is_subscribed')
+            )
+
+        return super().to_representation(users)
+
+
+class UserSerializer(SparseFieldsetMixin, DjoserUserSerializer):
     """Сериализатор для модели User."""
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta(DjoserUserSerializer.Meta):
         fields = DjoserUserSerializer.Meta.fields + ('is_subscribed',)
+        list_serializer_class = UserListSerializer
 
     def get_is_subscribed(self, user):
         """Возвращает значение для поля is_subscribed."""
-        client_user = self.context['request'].user
-        return (client_user.is_authenticated
-                and client_user.is_subscribed_to(user))
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+
+        return SubscriptionCache.for_request(
+            self.context['request']
+        ).is_subscribed_to(user)
 
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
@@ -53,26 +140,181 @@ class SetPasswordSerializer(DjoserSetPasswordSerializer):
 
 
 class Base64ImageField(serializers.FileField):
-    """Поле для представления файла, загружаемого на сайт в формате base64."""
+    """Поле для представления файла, загружаемого на сайт в формате base64.
+    Принимает также обычные загруженные файлы. Строка base64 декодируется
+    частями во временный файл, который хранится в памяти, пока невелик;
+    заведомо слишком большие данные и данные, не похожие на изображение,
+    отклоняются до полного декодирования. Размеры изображения проверяются
+    по его заголовку, без декодирования пикселей.
+    """
     file_name_base = 'image'
+    chunk_size = 64 * 1024
+    image_formats = ('PNG', 'JPEG', 'GIF', 'WEBP')
+    image_signatures = (
+        b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'RIFF'
+    )
+    default_error_messages = dict(
+        invalid_base64='Некорректные данные в формате base64.',
+        too_large='Размер файла не должен превышать {max_size} байт.',
+        not_image='Загрузите корректное изображение в формате '
+                  'PNG, JPEG, GIF или WEBP.',
+        too_big_dimensions='Ширина и высота изображения не должны '
+                           'превышать {max_dimension} пикселей.',
+    )
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                b64decode(imgstr),
-                name=f'{self.file_name_base}.{ext}'
-            )
+            data = self.decode(data)
+        elif getattr(data, 'size', 0) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+
+        if hasattr(data, 'read'):
+            data.name = f'{self.file_name_base}.{self.inspect(data).lower()}'
 
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        """Декодирует изображение в формате data URI во временный файл.
+        Строка base64 не копируется целиком: из неё по очереди берутся
+        части, из которых отбрасываются пробельные символы (например,
+        переносы строк, которыми разбивают длинные строки base64), а
+        символы сверх кратного 4 количества переносятся в следующую часть.
+        """
+        start = data.find(';base64,')
+        if start < 0:
+            self.fail('invalid_base64')
+
+        file = SpooledTemporaryFile(
+            max_size=settings.IMAGE_UPLOAD_SPOOL_SIZE
+        )
+        try:
+            self.decode_chunks(data, start + len(';base64,'), file)
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        except serializers.ValidationError:
+            file.close()
+            raise
+
+        return File(file)
+
+    def decode_chunks(self, data, start, file):
+        """Декодирует строку base64, начинающуюся с заданной позиции
+        строки data, в заданный файл частями по chunk_size символов.
+        """
+        size, rest = 0, ''
+        for offset in range(start, len(data), self.chunk_size):
+            encoded = rest + ''.join(
+                data[offset:offset + self.chunk_size].split()
+            )
+            end = len(encoded) // 4 * 4
+            encoded, rest = encoded[:end], encoded[end:]
+            chunk = b64decode(encoded, validate=True)
+            if not size and chunk and not chunk.startswith(
+                self.image_signatures
+            ):
+                self.fail('not_image')
+
+            size += len(chunk)
+            if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+                self.fail(
+                    'too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE
+                )
+
+            file.write(chunk)
+
+        if rest:
+            raise binascii.Error('Incorrect padding')
+
+    def inspect(self, file):
+        """Проверяет изображение по его заголовку и возвращает название
+        его формата.
+        """
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                format, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('not_image')
+        finally:
+            file.seek(0)
+
+        if format not in self.image_formats:
+            self.fail('not_image')
+
+        max_dimension = settings.IMAGE_UPLOAD_MAX_DIMENSION
+        if width > max_dimension or height > max_dimension:
+            self.fail('too_big_dimensions', max_dimension=max_dimension)
+
+        return format
+
 
 class RecipeImageField(Base64ImageField):
     """Поле для представления иллюстрации к рецепту."""
     file_name_base = 'recipe'
 
 
+class ImageRenditionField(serializers.ReadOnlyField):
+    """Поле, представляющее URL уменьшенной копии (варианта) иллюстрации
+    к рецепту шириной rendition_width в формате rendition_extension. Пока
+    варианты не созданы, поле ссылается на оригинал.
+    """
+    rendition_width = RECIPE_IMAGE_THUMBNAIL_WIDTH
+    rendition_extension = 'jpg'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image')
+        super().__init__(**kwargs)
+
+    def build_url(self, url):
+        """Возвращает абсолютный URL, если доступен объект запроса."""
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_representation(self, image):
+        if not image:
+            return None
+
+        if not has_renditions(image):
+            return self.represent_original(image)
+
+        return self.represent_renditions(image)
+
+    def represent_original(self, image):
+        """Возвращает представление поля по оригиналу изображения."""
+        return self.build_url(image.url)
+
+    def represent_renditions(self, image):
+        """Возвращает представление поля по вариантам изображения."""
+        return self.build_url(get_rendition_url(
+            image, self.rendition_width, self.rendition_extension
+        ))
+
+
+class ImageThumbField(ImageRenditionField):
+    """Поле, представляющее URL миниатюры иллюстрации в формате JPEG."""
+    rendition_width = RECIPE_IMAGE_THUMBNAIL_WIDTH
+    rendition_extension = 'jpg'
+
+
+class ImageSrcsetField(ImageRenditionField):
+    """Поле, представляющее значение атрибута srcset тега img: список
+    вариантов иллюстрации в формате WebP с их шириной.
+    """
+    rendition_extension = 'webp'
+
+    def represent_original(self, image):
+        return ''
+
+    def represent_renditions(self, image):
+        extension = self.rendition_extension
+        return ', '.join(
+            f'{self.build_url(get_rendition_url(image, width, extension))} '
+            f'{width}w'
+            for width in RECIPE_IMAGE_RENDITION_WIDTHS
+        )
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Tag."""
     class Meta:
@@ -80,9 +322,71 @@ class TagSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+def to_pk(model, value):
+    """Приводит значение к типу первичного ключа заданной модели."""
+    if isinstance(value, bool):
+        raise TypeError
+
+    return model._meta.pk.get_prep_value(value)
+
+
+def preload(queryset, values):
+    """Загружает одним запросом объекты кверисета с заданными первичными
+    ключами. Некорректные значения пропускаются: ошибки по ним сообщаются
+    при валидации соответствующих элементов.
+    """
+    pks = set()
+    for value in values:
+        try:
+            pks.add(to_pk(queryset.model, value))
+        except (TypeError, ValueError):
+            pass
+
+    return queryset.in_bulk(pks)
+
+
+class PreloadingListSerializer(serializers.ListSerializer):
+    """Сериализатор для списков, перед валидацией элементов передающий
+    весь список методу preload() дочернего сериализатора. Это позволяет
+    загрузить из БД все объекты, на которые ссылаются элементы, одним
+    запросом.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.preload(data)
+
+        return super().to_internal_value(data)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле для ссылки на объект по первичному ключу, получающее объекты
+    из заранее загруженного набора, если он есть. Сообщения об ошибках
+    совпадают с сообщениями PrimaryKeyRelatedField.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.preloaded = None
+
+    def preload(self, values):
+        """Загружает одним запросом объекты с заданными первичными ключами.
+        """
+        self.preloaded = preload(self.get_queryset(), values)
+
+    def to_internal_value(self, data):
+        if self.preloaded is None:
+            return super().to_internal_value(data)
+
+        try:
+            return self.preloaded[to_pk(self.get_queryset().model, data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class IngredientOccurenceSerialiser(serializers.ModelSerializer):
     """Сериализатор для модели IngredientOccurence."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = PreloadedPrimaryKeyRelatedField(
         source='ingredient', queryset=Ingredient.objects.all()
     )
     measurement_unit = serializers.CharField(
@@ -95,33 +399,72 @@ class IngredientOccurenceSerialiser(serializers.ModelSerializer):
     class Meta:
         model = IngredientOccurence
         fields = ('id', 'amount', 'measurement_unit', 'name')
+        list_serializer_class = PreloadingListSerializer
+
+    def preload(self, data):
+        """Загружает одним запросом ингредиенты, упомянутые в списке."""
+        self.fields['id'].preload(
+            item['id'] for item in data
+            if isinstance(item, dict) and 'id' in item
+        )
 
 
 class TagField(TagSerializer):
     """Поле для представления модели Tag в составе других объектов."""
+    class Meta(TagSerializer.Meta):
+        list_serializer_class = PreloadingListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preloaded = None
+
+    def preload(self, data):
+        """Загружает одним запросом теги, упомянутые в списке."""
+        self.preloaded = preload(Tag.objects.all(), data)
+
     def to_internal_value(self, data):
         try:
-            return Tag.objects.get(pk=data)
-        except ValueError:
+            pk = to_pk(Tag, data)
+            if self.preloaded is None:
+                return Tag.objects.get(pk=pk)
+
+            return self.preloaded[pk]
+        except (TypeError, ValueError):
             raise serializers.ValidationError(
                 ['Идентификатор тега должен быть целым числом.']
             )
-        except Tag.DoesNotExist:
+        except (KeyError, Tag.DoesNotExist):
             raise serializers.ValidationError(
                 ['Тег с таким идентификатором не найден.']
             )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeAuthorField(UserSerializer):
+    """Поле для представления автора в составе рецепта."""
+    def get_attribute(self, recipe):
+        """Возвращает автора рецепта. Если кверисет рецептов аннотирован
+        полем is_author_subscribed, переносит его значение в автора,
+        избавляя от отдельного запроса к БД.
+        """
+        author = super().get_attribute(recipe)
+        if hasattr(recipe, 'is_author_subscribed'):
+            author.is_subscribed = recipe.is_author_subscribed
+
+        return author
+
+
+class RecipeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для модели Recipe."""
     image = RecipeImageField(required=True)
+    image_thumb = ImageThumbField()
+    image_srcset = ImageSrcsetField()
     tags = TagField(
         required=True, many=True, allow_empty=False,
     )
     ingredients = IngredientOccurenceSerialiser(
         required=True, many=True, allow_empty=False
     )
-    author = UserSerializer(read_only=True)
+    author = RecipeAuthorField(read_only=True)
     is_favorited = serializers.BooleanField(read_only=True, default=False)
     is_in_shopping_cart = serializers.BooleanField(
         read_only=True, default=False
@@ -132,9 +475,11 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'author', 'ingredients', 'tags',
             'name', 'text', 'cooking_time', 'image',
+            'image_thumb', 'image_srcset',
             'is_favorited', 'is_in_shopping_cart'
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создаёт объект типа Recipe."""
         ingredients = validated_data.pop('ingredients')
@@ -142,26 +487,54 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.set_tags(tags)
         recipe.add_ingredients(ingredients)
+        recipe.update_similarity_index(
+            occurence['ingredient'].pk for occurence in ingredients
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Изменяет объект типа Recipe."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         instance = super().update(instance, validated_data)
-        instance.tags.set(tags)
-        instance.ingredients.all().delete()
-        instance.add_ingredients(ingredients)
+        instance.set_tags(tags)
+        instance.set_ingredients(ingredients)
         return instance
 
 
+class PantryRecipeSerializer(RecipeSerializer):
+    """Сериализатор для представления рецепта в подборке по имеющимся
+    ингредиентам.
+    """
+    pantry_match = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('pantry_match',)
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """Сериализатор для загрузки иллюстрации к рецепту отдельным файлом."""
+    image = RecipeImageField(required=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
+
 class ReducedRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для представления модели Recipe в составе других
     объектов.
     """
+    image_thumb = ImageThumbField()
+    image_srcset = ImageSrcsetField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'cooking_time', 'image')
+        fields = (
+            'id', 'name', 'cooking_time', 'image',
+            'image_thumb', 'image_srcset'
+        )
         read_only_fields = ('name', 'cooking_time', 'image')
 
 
@@ -169,47 +542,55 @@ class RecipeUserSetSerializer(ReducedRecipeSerializer):
     """Сериализатор для использования при включении рецепта в набор (список)
     у пользователя и исключении из него.
     """
-    set_name = 'undefined'
+    set_model = NotImplemented
 
-    def validate(self, data):
+    def update(self, instance, validated_data):
+        """Включает рецепт в набор или исключает из него. Наличие рецепта в
+        наборе определяется по результату этой операции, а не отдельным
+        запросом, поэтому повторные и одновременные запросы обрабатываются
+        корректно.
+        """
         user = self.context['request'].user
-        recipe_in_set = self.instance in getattr(user, self.set_name).all()
         if self.context['request'].method == 'POST':
-            if recipe_in_set:
+            if not self.set_model.add(user, (instance.pk,)):
                 raise serializers.ValidationError(
-                    dict(errors='Этот рецепт уже есть в этом списке.'),
+                    dict(errors=['Этот рецепт уже есть в этом списке.']),
                 )
 
-        else:
-            if not recipe_in_set:
-                raise serializers.ValidationError(
-                    dict(errors='Этого рецепта нет в этом списке.'),
-                )
+        elif not self.set_model.remove(user, (instance.pk,)):
+            raise serializers.ValidationError(
+                dict(errors=['Этого рецепта нет в этом списке.']),
+            )
 
-        return data
+        return instance
 
-    def update(self, instance, validated_data):
-        user = self.context['request'].user
-        if self.context['request'].method == 'POST':
-            getattr(user, self.set_name).add(instance)
-        else:
-            getattr(user, self.set_name).remove(instance)
 
-        return instance
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор для списка id рецептов в пакетных операциях с наборами
+    (списками) пользователя.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=settings.RECIPE_BULK_MAX_IDS
+    )
+
+    def validate_ids(self, value):
+        """Исключает повторяющиеся id, сохраняя порядок."""
+        return list(dict.fromkeys(value))
 
 
 class RecipeShoppingCartSerializer(RecipeUserSetSerializer):
     """Сериализатор для использования при включении рецепта в список
     покупок пользователя и исключении из него.
     """
-    set_name = 'shopping_cart'
+    set_model = RecipeInShoppingCart
 
 
 class RecipeFavoritesSerializer(RecipeUserSetSerializer):
     """Сериализатор для использования при включении рецепта в
     избранные рецепты пользователя и исключении из них.
     """
-    set_name = 'favorites'
+    set_model = RecipeInFavorites
 
 
 class ExtendedUserSerializer(UserSerializer):
@@ -217,31 +598,28 @@ class ExtendedUserSerializer(UserSerializer):
     рецептах данного пользователя.
     """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
-    def get_recipes_count(self, user):
-        """Возвращает значение для поля recipes_count."""
-        return user.recipes.count()
-
     def get_recipes(self, user):
         """Возвращает значение для поля recipes."""
-        limit = self._get_recipes_limit()
+        if hasattr(user, 'recipes_preview'):
+            recipes = user.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context['request'])
+            recipes = project(
+                user.recipes.all(), ReducedRecipeSerializer, 'author'
+            )
+            if limit:
+                recipes = recipes[0:limit]
+
         serializer = ReducedRecipeSerializer(
-            user.recipes.all()[0:limit] if limit else user.recipes,
-            many=True, context=self.context
+            recipes, many=True, context=self.context
         )
         return serializer.data
 
-    def _get_recipes_limit(self):
-        """Возвращает значение параметра recipes_limit из строки запроса,
-        если он там есть. В противном случае - 0.
-        """
-        limit = self.context['request'].query_params.get('recipes_limit', '')
-        return int(limit) if re.fullmatch(r'\d+', limit) else 0
-
 
 class UserSubscribeSerializer(ExtendedUserSerializer):
     """Сериализатор для использования при подписке и отписке."""
@@ -256,24 +634,23 @@ class UserSubscribeSerializer(ExtendedUserSerializer):
                     dict(errors='Нельзя подписаться на самого себя.'),
                 )
 
-            if user.is_subscribed_to(self.instance):
-                raise serializers.ValidationError(
-                    dict(errors='Вы уже подписаны на этого автора.'),
-                )
-
-        else:
-            if not user.is_subscribed_to(self.instance):
-                raise serializers.ValidationError(
-                    dict(errors='Вы не подписаны на этого автора.'),
-                )
-
         return data
 
     def update(self, instance, validated_data):
         user = self.context['request'].user
-        if self.context['request'].method == 'POST':
-            user.subscribe_to(instance)
-        else:
-            user.unsubscribe_from(instance)
+        subscribed = self.context['request'].method == 'POST'
+        if subscribed:
+            if not user.subscribe_to(instance):
+                raise serializers.ValidationError(
+                    dict(errors=['Вы уже подписаны на этого автора.']),
+                )
 
+        elif not user.unsubscribe_from(instance):
+            raise serializers.ValidationError(
+                dict(errors=['Вы не подписаны на этого автора.']),
+            )
+
+        SubscriptionCache.for_request(self.context['request']).set(
+            instance, subscribed
+        )
         return instance
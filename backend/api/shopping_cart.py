@@ -1,50 +1,98 @@
 """Содержит классы, отвечающие за формирование списка покупок в текстовом
-виде.
+виде, а также в форматах CSV и JSON.
 """
+import csv
+import json
 
+from django.db.models import Sum
 
-def get_shopping_cart_txt(user):
-    """Возвращает список покупок заданного пользователя в текстовом виде."""
-    cart = ShoppingCart(user)
-    return cart.to_text()
+from recipes.models import IngredientOccurence
 
 
-class Ingredient:
-    """Представляет ингредиент в списке покупок."""
-    def __init__(self, occurence):
-        """Инициализирует ингредиент в списке покупок."""
-        self.name = occurence.ingredient.name
-        self.measurement_unit = occurence.ingredient.measurement_unit
-        self.amount = occurence.amount
-
-    def add_amount(self, occurence):
-        """Увеличивает количество ингредиента в списке покупок."""
-        self.amount += occurence.amount
-
-    def __str__(self):
-        return f'{self.name}, {self.measurement_unit} - {self.amount}'
+class EchoBuffer:
+    """Псевдобуфер, возвращающий записываемые в него данные. Позволяет
+    использовать csv.writer для построчной генерации вывода.
+    """
+    def write(self, value):
+        """Возвращает переданное значение вместо его записи."""
+        return value
 
 
 class ShoppingCart:
     """Представляет список покупок."""
+    formats = dict(
+        txt=('text/plain; charset=utf-8', 'iter_text'),
+        csv=('text/csv; charset=utf-8', 'iter_csv'),
+        json=('application/json; charset=utf-8', 'iter_json'),
+    )
+    default_format = 'txt'
+    csv_header = ('Название', 'Единица измерения', 'Количество')
+
     def __init__(self, user):
-        """Создаёт список покупок на основании поля shopping_cart объекта
-        модели User.
+        """Создаёт список покупок для заданного пользователя. Суммирование
+        количеств ингредиентов выполняется одним запросом на стороне БД.
+        """
+        self.items = IngredientOccurence.objects.filter(
+            recipe__in_shopping_cart=user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+    def __iter__(self):
+        """Перебирает позиции списка покупок в виде кортежей
+        (название, единица измерения, количество).
+        """
+        for item in self.items.iterator():
+            yield (
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount'],
+            )
+
+    def get_content_type(self, format):
+        """Возвращает значение заголовка Content-Type для заданного
+        формата.
         """
-        self.cart = {}
-        for recipe in user.shopping_cart.all():
-            for occurence in recipe.ingredients.all():
-                key = occurence.ingredient.pk
-                if key in self.cart:
-                    self.cart[key].add_amount(occurence)
-                else:
-                    self.cart[key] = Ingredient(occurence)
-
-    def to_text(self):
-        """Возвращает текстовое представление списка покупок."""
-        if self.cart:
-            lines = [str(ingredient) for ingredient in self.cart.values()]
-            lines.append('')
-            return '\n'.join(lines)
-
-        return 'Ваш список покупок пуст.\n'
+        return self.formats[format][0]
+
+    def iter_format(self, format):
+        """Возвращает итератор по частям представления списка покупок в
+        заданном формате.
+        """
+        return getattr(self, self.formats[format][1])()
+
+    def iter_text(self):
+        """Перебирает строки текстового представления списка покупок."""
+        empty = True
+        for name, measurement_unit, amount in self:
+            empty = False
+            yield f'{name}, {measurement_unit} - {amount}\n'
+
+        if empty:
+            yield 'Ваш список покупок пуст.\n'
+
+    def iter_csv(self):
+        """Перебирает строки представления списка покупок в формате CSV."""
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(self.csv_header)
+        for row in self:
+            yield writer.writerow(row)
+
+    def iter_json(self):
+        """Перебирает части представления списка покупок в формате JSON."""
+        separator = ''
+        yield '['
+        for name, measurement_unit, amount in self:
+            yield separator + json.dumps(
+                dict(
+                    name=name,
+                    measurement_unit=measurement_unit,
+                    amount=amount
+                ),
+                ensure_ascii=False
+            )
+            separator = ', '
+
+        yield ']\n'
@@ -0,0 +1,123 @@
+"""Содержит обработчики сигналов, используемые приложением api."""
+from functools import reduce
+from operator import or_
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.versions import bump_version
+from recipes.models import (
+    Tag, Ingredient, Recipe, RecipeInFavorites, RecipeInShoppingCart
+)
+from recipes.search import remove_from_search_index
+from users.models import User, Subscription
+from .ingredient_index import ingredient_index
+from .serializers import UserSerializer
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Помечает индекс ингредиентов как устаревший и обновляет версию их
+    данных при их изменении.
+    """
+    ingredient_index.invalidate()
+    bump_version(Ingredient)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Обновляет версию данных тегов при их изменении."""
+    bump_version(Tag)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(sender, **kwargs):
+    """Обновляет версию данных рецептов при их изменении."""
+    bump_version(Recipe)
+
+
+@receiver((post_save, post_delete), sender=RecipeInFavorites)
+@receiver((post_save, post_delete), sender=RecipeInShoppingCart)
+@receiver(m2m_changed, sender=RecipeInFavorites)
+@receiver(m2m_changed, sender=RecipeInShoppingCart)
+def bump_user_sets_version(sender, **kwargs):
+    """Обновляет версию данных избранного или списков покупок при их
+    изменении средствами ORM. Представление рецептов для анонимных
+    пользователей от них не зависит, поэтому версия данных рецептов не
+    меняется.
+    """
+    bump_version(sender)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_search_data(sender, instance, using, **kwargs):
+    """Удаляет данные поиска удалённого рецепта."""
+    remove_from_search_index([instance.pk], using)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_author_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счётчик рецептов автора удалённого рецепта. Обработчик
+    сигнала, а не метод Recipe.delete(), учитывает и удаление рецептов
+    кверисетом (например, в админке).
+    """
+    instance.update_author_recipes_count(-1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_masks(sender, instance, action, reverse, pk_set, **kwargs):
+    """Обновляет битовые маски тегов рецептов при изменении их тегов."""
+    if action == 'post_clear':
+        if reverse:
+            Recipe.objects.update(
+                tags_mask=F('tags_mask').bitand(~Tag.get_bit(instance.pk))
+            )
+        else:
+            Recipe.objects.filter(pk=instance.pk).update(tags_mask=0)
+
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            bits = Tag.get_bit(instance.pk)
+            recipes = Recipe.objects.filter(pk__in=pk_set)
+        else:
+            bits = reduce(or_, map(Tag.get_bit, pk_set), 0)
+            recipes = Recipe.objects.filter(pk=instance.pk)
+
+        if bits:
+            recipes.update(tags_mask=(
+                F('tags_mask').bitor(bits) if action == 'post_add'
+                else F('tags_mask').bitand(~bits)
+            ))
+
+
+@receiver(post_save, sender=User)
+def bump_users_version_on_save(sender, update_fields=None, **kwargs):
+    """Обновляет версию данных пользователей при изменении полей, входящих
+    в их представление. Сохранение только служебных полей (например,
+    last_login при входе) версию не меняет.
+    """
+    if update_fields is None or not update_fields.isdisjoint(
+        UserSerializer.Meta.fields
+    ):
+        bump_version(User)
+
+
+@receiver(post_delete, sender=User)
+def bump_users_version(sender, **kwargs):
+    """Обновляет версию данных пользователей при удалении пользователя."""
+    bump_version(User)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(m2m_changed, sender=Subscription)
+def bump_subscriptions_version(sender, **kwargs):
+    """Обновляет версию данных подписок при их изменении средствами ORM.
+    Обработчик post_delete не подключается, чтобы отписка оставалась
+    одним запросом DELETE; её, как и подписку, учитывают методы
+    User.subscribe_to и User.unsubscribe_from. Представление рецептов для
+    анонимных пользователей от подписок не зависит, поэтому версия данных
+    пользователей не меняется.
+    """
+    bump_version(Subscription)
@@ -0,0 +1,58 @@
+"""Содержит класс, кэширующий сведения о подписках клиента в пределах
+одного запроса.
+"""
+
+
+class SubscriptionCache:
+    """Хранит сведения о том, подписан ли клиент на тех или иных
+    пользователей. Экземпляр создаётся на время обработки одного запроса и
+    используется всеми сериализаторами пользователей в нём.
+    """
+    request_attr = '_subscription_cache'
+
+    def __init__(self, user):
+        """Инициализирует пустой кэш для заданного клиента."""
+        self.user = user
+        self.subscribed = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """Возвращает кэш, связанный с заданным запросом, при необходимости
+        создавая его.
+        """
+        cache = getattr(request, cls.request_attr, None)
+        if cache is None:
+            cache = cls(request.user)
+            setattr(request, cls.request_attr, cache)
+
+        return cache
+
+    def load(self, author_ids):
+        """Загружает одним запросом сведения о подписках клиента на
+        пользователей с заданными идентификаторами, ещё не известные кэшу.
+        """
+        missing = set(author_ids) - self.subscribed.keys()
+        if not missing:
+            return
+
+        if self.user.is_authenticated:
+            found = set(
+                self.user.subscriptions_of.filter(
+                    subscribed_to__in=missing
+                ).values_list('subscribed_to', flat=True)
+            )
+        else:
+            found = set()
+
+        self.subscribed.update(
+            (author_id, author_id in found) for author_id in missing
+        )
+
+    def is_subscribed_to(self, author):
+        """Возвращает True, если клиент подписан на заданного автора."""
+        self.load((author.pk,))
+        return self.subscribed[author.pk]
+
+    def set(self, author, value):
+        """Обновляет сведения о подписке клиента на заданного автора."""
+        self.subscribed[author.pk] = value
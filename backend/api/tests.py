@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }}
+)
+class RecipeQueriesTests(APITestCase):
+    """Проверяет, что количество запросов к БД при получении рецептов не
+    зависит от количества рецептов на странице: теги, ингредиенты и автор
+    загружаются для всех рецептов страницы сразу.
+    """
+    RECIPES_COUNT = 15
+    INGREDIENTS_PER_RECIPE = 5
+
+    # Аутентификация по токену, количество рецептов, рецепты страницы,
+    # их теги и их ингредиенты.
+    LIST_QUERIES = 5
+    # Аутентификация по токену, время изменения рецепта для условного
+    # запроса, рецепт, его теги и его ингредиенты.
+    RETRIEVE_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            User.objects.create_user(
+                email=f'user{i}@example.com', username=f'user{i}',
+                password='Password123', first_name='Имя',
+                last_name='Фамилия'
+            )
+            for i in range(3)
+        ]
+        cls.user = users[0]
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}'
+            )
+            for i in range(3)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        )
+        cls.recipes = []
+        for i in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {i}', text='Описание', cooking_time=5,
+                author=users[i % len(users)],
+                image=ContentFile(b'image', name='recipe.png')
+            )
+            recipe.tags.set(tags[:i % len(tags) + 1])
+            recipe.add_ingredients([
+                dict(
+                    ingredient=ingredients[(i + j) % len(ingredients)],
+                    amount=j + 1
+                )
+                for j in range(cls.INGREDIENTS_PER_RECIPE)
+            ])
+            cls.recipes.append(recipe)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def test_list_queries(self):
+        for limit in (3, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                with self.assertNumQueries(self.LIST_QUERIES):
+                    response = self.client.get(
+                        '/api/recipes/', {'limit': limit}
+                    )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+                self.assertEqual(
+                    response.data['count'], self.RECIPES_COUNT
+                )
+
+    def test_retrieve_queries(self):
+        recipe = self.recipes[0]
+        with self.assertNumQueries(self.RETRIEVE_QUERIES):
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], recipe.id)
+        self.assertEqual(
+            len(response.data['ingredients']), self.INGREDIENTS_PER_RECIPE
+        )
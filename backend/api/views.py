@@ -1,28 +1,55 @@
 """Содержит обработчики для эндпойнтов API."""
-from django.db.models import Value, OuterRef, Exists
-from django.http import HttpResponse
+from hashlib import md5
+import logging
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.core.cache import cache
+from django.db.models import Count, Value, OuterRef, Exists, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 import django_filters.rest_framework as dj_filters
 from djoser.views import TokenCreateView, UserViewSet as DjoserUserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.viewsets import ReadOnlyModelViewSet, ModelViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from PIL import Image
 
-from recipes.models import Tag, Ingredient, Recipe
-from recipes.constants import RECIPES_ORDERING
-from users.models import User
+from recipes.models import (
+    Tag, Ingredient, Recipe, IngredientOccurence,
+    RecipeInFavorites, RecipeInShoppingCart, RecipeSimilarityBand,
+)
+from recipes.constants import RECIPES_ORDERING, SIMILAR_RECIPES_LIMIT
+from recipes.renditions import create_renditions
+from core.conditional import ConditionalGetMixin, make_etag
+from core.paginators import KeysetPagination
+from core.projections import ProjectionMixin, project
+from core.response_cache import AnonymousResponseCacheMixin
+from core.versions import bump_version, get_modified, get_version
+from users.constants import FEED_ORDERING
+from users.models import Subscription, User
 from .serializers import (
     TagSerializer, IngredientSerializer,
-    RecipeSerializer,
+    RecipeSerializer, RecipeImageSerializer, RecipeIdsSerializer,
+    PantryRecipeSerializer,
+    ReducedRecipeSerializer,
     RecipeShoppingCartSerializer, RecipeFavoritesSerializer,
-    ExtendedUserSerializer, UserSubscribeSerializer
+    ExtendedUserSerializer, UserSubscribeSerializer,
+    get_recipes_limit, get_sparse_fields
+)
+from .filters import (
+    IngredientFilterSet, RecipeFilterBackend, filter_pantry, get_ids
 )
-from .filters import IngredientFilterSet, RecipeFilterBackend
+from .ingredient_index import ingredient_index
 from .permissions import RecipesPermission
-from .shopping_cart import get_shopping_cart_txt
+from .shopping_cart import ShoppingCart
+
+logger = logging.getLogger(__name__)
 
 
 class GetTokenView(TokenCreateView):
@@ -44,9 +71,10 @@ class UserSetActionMixin:
         """Выполняет операции добавления в список
         и исключения из него.
         """
-        serializer = self.get_serializer(
-            get_object_or_404(self.user_set_item_model, pk=pk),
-            data=request.data
+        serializer = self.get_serializer(data=request.data)
+        serializer.instance = get_object_or_404(
+            project(self.user_set_item_model.objects.all(), serializer),
+            pk=pk
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -62,18 +90,57 @@ class UserSetActionMixin:
         )
 
 
-class UserViewSet(DjoserUserViewSet, UserSetActionMixin):
+class UserViewSet(ProjectionMixin, DjoserUserViewSet, UserSetActionMixin):
     """Набор обработчиков, обеспечивающих доступ к ресурсам:
     - 'Пользователи';
     - 'Подписки'.
     """
     user_set_item_model = User
+    projection_actions = ('list', 'subscriptions')
 
     def get_queryset(self):
         if self.request.path == reverse('users-subscriptions'):
-            return self.request.user.subscribed_to.all()
+            return self.project(self.get_subscriptions_queryset())
 
-        return super().get_queryset()
+        return self.project(super().get_queryset())
+
+    def get_count_version(self):
+        """Возвращает версию данных, от которых зависит количество
+        пользователей в списке: для списка подписок - версию подписок.
+        """
+        return get_version(
+            Subscription if self.action == 'subscriptions' else User
+        )
+
+    def get_subscriptions_queryset(self):
+        """Возвращает кверисет для доступа к ресурсу 'Подписки'.
+        Последние рецепты всех авторов страницы загружаются одним
+        дополнительным запросом: срез в Prefetch Django выполняет с помощью
+        оконной функции ROW_NUMBER() с разбиением по автору. Если клиент не
+        выбрал поле recipes, рецепты не загружаются.
+        """
+        fields = get_sparse_fields(
+            self.request, ExtendedUserSerializer.Meta.fields
+        )
+        queryset = self.request.user.subscribed_to.all()
+        if 'is_subscribed' in fields:
+            queryset = queryset.annotate(is_subscribed=Value(True))
+
+        if 'recipes' not in fields:
+            return queryset
+
+        recipes = Recipe.objects.order_by(*RECIPES_ORDERING)
+        limit = get_recipes_limit(self.request)
+        if limit:
+            recipes = recipes[:limit]
+
+        return queryset.prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=project(recipes, ReducedRecipeSerializer, 'author'),
+                to_attr='recipes_preview'
+            )
+        )
 
     @action(['get'], detail=False, serializer_class=ExtendedUserSerializer,
             permission_classes=[IsAuthenticated])
@@ -91,23 +158,79 @@ class UserViewSet(DjoserUserViewSet, UserSetActionMixin):
         return self.add_remove(request, id)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class CatalogViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    """Базовый набор обработчиков для справочников. Ответы сопровождаются
+    заголовками ETag и Last-Modified, вычисляемыми по версии данных
+    справочника, и допускают длительное кэширование.
+    """
+    pagination_class = None
+
+    @property
+    def cache_control(self):
+        return dict(public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+
+    def get_etag(self, request):
+        model = self.queryset.model
+        return make_etag(model._meta.label_lower, get_version(model))
+
+    def get_last_modified(self, request):
+        return get_modified(self.queryset.model)
+
+
+class TagViewSet(CatalogViewSet):
     """Набор обработчиков, обеспечивающих доступ к ресурсу 'Теги'."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogViewSet):
     """Набор обработчиков, обеспечивающих доступ к ресурсу 'Ингредиенты'."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    pagination_class = None
     filter_backends = (dj_filters.DjangoFilterBackend,)
     filterset_class = IngredientFilterSet
 
+    def list(self, request, *args, **kwargs):
+        """Возвращает список ингредиентов. Поиск по названию выполняется
+        с помощью индекса в памяти, если он включён настройкой
+        INGREDIENT_SEARCH_INDEX.
+        """
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_INDEX:
+            serializer = self.get_serializer(
+                ingredient_index.search(name, self.get_search_limit()),
+                many=True
+            )
+            return Response(serializer.data)
+
+        return super().list(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        """Применяет фильтры и ограничивает размер результатов поиска по
+        названию.
+        """
+        queryset = super().filter_queryset(queryset)
+        if self.request.query_params.get('name'):
+            queryset = queryset[:self.get_search_limit()]
+
+        return queryset
+
+    def get_search_limit(self):
+        """Возвращает максимальное количество результатов поиска по
+        названию: значение параметра limit строки запроса, но не больше
+        INGREDIENT_SEARCH_LIMIT.
+        """
+        limit = self.request.query_params.get('limit', '')
+        if re.fullmatch(r'\d+', limit) and int(limit) > 0:
+            return min(int(limit), settings.INGREDIENT_SEARCH_LIMIT)
+
+        return settings.INGREDIENT_SEARCH_LIMIT
+
 
-class RecipeViewSet(ModelViewSet, UserSetActionMixin):
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousResponseCacheMixin, ProjectionMixin,
+    ModelViewSet, UserSetActionMixin
+):
     """Набор обработчиков, обеспечивающих доступ к ресурсам:
     - 'Рецепты';
     - 'Список покупок';
@@ -117,34 +240,226 @@ class RecipeViewSet(ModelViewSet, UserSetActionMixin):
     permission_classes = (RecipesPermission,)
     filter_backends = (RecipeFilterBackend,)
     user_set_item_model = Recipe
+    ordering = RECIPES_ORDERING
+    keyset_pagination_class = KeysetPagination
+    conditional_actions = ('retrieve',)
+    cache_control = dict(private=True, no_cache=True)
+    vary_headers = ('Authorization',)
+    response_cache_models = (Recipe, Tag, Ingredient, User)
+    facets_ignored_params = (
+        'tags', 'page', 'limit', 'cursor', 'pagination', 'fields', 'omit'
+    )
+    user_set_models = dict(
+        is_favorited=RecipeInFavorites,
+        is_in_shopping_cart=RecipeInShoppingCart,
+    )
+    filter_by_tags = True
+    projection_actions = ('list', 'retrieve', 'pantry', 'similar', 'feed')
+    projection_fields = ('pub_date',)
+    annotation_fields = dict(
+        is_favorited='is_favorited',
+        is_in_shopping_cart='is_in_shopping_cart',
+        is_author_subscribed='author',
+    )
+
+    @property
+    def paginator(self):
+        """Возвращает пажинатор. Постраничный вывод по курсору включается
+        параметром pagination=cursor строки запроса или наличием в ней
+        курсора.
+        """
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            if (
+                query_params.get('pagination') == 'cursor'
+                or self.keyset_pagination_class.cursor_query_param
+                in query_params
+            ):
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = super().paginator
+
+        return self._paginator
 
     def get_queryset(self):
-        """Возвращает кверисет для доступа к ресурсу 'Рецепты'."""
-        queryset = Recipe.objects.all()
+        """Возвращает кверисет для доступа к ресурсу 'Рецепты'. При
+        чтении загружаются только столбцы, нужные сериализатору, а
+        связанные объекты и аннотации - только для выбранных клиентом полей.
+        """
+        fields = get_sparse_fields(self.request, RecipeSerializer.Meta.fields)
+        queryset = self.get_annotated_queryset(fields)
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+
+        prefetches = []
+        if 'tags' in fields:
+            prefetches.append(Prefetch('tags', queryset=Tag.objects.all()))
+
+        if 'ingredients' in fields:
+            prefetches.append(Prefetch(
+                'ingredients',
+                queryset=IngredientOccurence.objects.select_related(
+                    'ingredient'
+                )
+            ))
+
+        return self.project(queryset).prefetch_related(*prefetches)
+
+    def get_annotated_queryset(self, fields=RecipeSerializer.Meta.fields):
+        """Возвращает кверисет рецептов, аннотированный сведениями об их
+        отношении к клиенту, без загрузки связанных объектов. Аннотации
+        добавляются только для заданных полей представления рецепта.
+        """
+        queryset = Recipe.objects.defer('search_vector')
         user = self.request.user
         if user.is_authenticated:
-            queryset = queryset.annotate(
+            annotations = dict(
                 is_favorited=Exists(
                     user.favorites.filter(pk=OuterRef('pk'))
                 ),
                 is_in_shopping_cart=Exists(
                     user.shopping_cart.filter(pk=OuterRef('pk'))
                 ),
+                is_author_subscribed=Exists(
+                    user.subscribed_to.filter(pk=OuterRef('author'))
+                ),
             )
         else:
-            queryset = queryset.annotate(
-                is_favorited=Value(False), is_in_shopping_cart=Value(False)
+            annotations = dict(
+                is_favorited=Value(False), is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False)
             )
 
-        return queryset.order_by(*RECIPES_ORDERING)
+        return queryset.annotate(**{
+            name: annotation for name, annotation in annotations.items()
+            if self.annotation_fields[name] in fields
+        }).order_by(*RECIPES_ORDERING)
+
+    def get_recipe_state(self):
+        """Возвращает дату изменения запрошенного рецепта и сведения о его
+        отношении к клиенту одним запросом без загрузки связанных объектов.
+        Если рецепт не найден, возвращает None.
+        """
+        if not hasattr(self, '_recipe_state'):
+            try:
+                self._recipe_state = self.get_annotated_queryset().filter(
+                    pk=self.kwargs['pk']
+                ).values_list(
+                    'modified', 'is_favorited', 'is_in_shopping_cart',
+                    'is_author_subscribed'
+                ).first()
+            except (TypeError, ValueError):
+                self._recipe_state = None
+
+        return self._recipe_state
+
+    def get_etag(self, request):
+        """Возвращает ETag рецепта. Он зависит от даты изменения рецепта,
+        его отношения к клиенту и версий данных тегов, ингредиентов и
+        пользователей, представление которых входит в ответ.
+        """
+        state = self.get_recipe_state()
+        if state is None:
+            return None
+
+        return make_etag(
+            self.kwargs['pk'], *state,
+            get_version(Tag), get_version(Ingredient), get_version(User)
+        )
+
+    def get_last_modified(self, request):
+        """Возвращает время последнего изменения рецепта или данных,
+        входящих в его представление.
+        """
+        state = self.get_recipe_state()
+        if state is None:
+            return None
+
+        models = (Tag, Ingredient, User)
+        if request.user.is_authenticated:
+            models += tuple(self.user_set_models.values())
+
+        return max(state[0], *map(get_modified, models))
+
+    def get_count_version(self):
+        """Возвращает версию данных, от которых зависит количество рецептов
+        в списке: версию рецептов и версии наборов пользователя, по которым
+        список отфильтрован.
+        """
+        return '-'.join(
+            str(get_version(model))
+            for model in (Recipe, *(
+                model for name, model in self.user_set_models.items()
+                if name in self.request.query_params
+            ))
+        )
 
     def perform_create(self, serializer):
         """Выполняет операцию создания рецепта."""
         serializer.save(author=self.request.user)
+        self.create_renditions(serializer)
+        bump_version(Recipe)
+        self.reload_instance(serializer)
 
     def perform_update(self, serializer):
         """Выполняет операцию изменения рецепта."""
         serializer.save(author=self.request.user)
+        self.create_renditions(serializer)
+        bump_version(Recipe)
+        self.reload_instance(serializer)
+
+    @staticmethod
+    def create_renditions(serializer):
+        """Создаёт уменьшенные копии иллюстрации, если она была загружена.
+        Копии больших иллюстраций, декодирование которых потребовало бы
+        слишком много памяти, при обработке запроса не создаются: их
+        создаёт команда create_renditions. Ошибки декодирования (например,
+        повреждённых данных изображения с корректным заголовком) не
+        прерывают запрос: рецепт уже сохранён и ссылается на оригинал.
+        """
+        if 'image' not in serializer.validated_data:
+            return
+
+        image = serializer.instance.image
+        try:
+            create_renditions(
+                image, max_pixels=settings.IMAGE_RENDITION_INLINE_MAX_PIXELS
+            )
+        except (OSError, Image.DecompressionBombError):
+            logger.exception(
+                'Не удалось создать варианты изображения %s.', image.name
+            )
+
+    def reload_instance(self, serializer):
+        """Заново загружает сохранённый рецепт вместе со связанными
+        объектами, чтобы представление ответа строилось без отдельного
+        запроса для каждого ингредиента.
+        """
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
+
+    def perform_destroy(self, instance):
+        """Выполняет операцию удаления рецепта."""
+        instance.delete()
+        bump_version(Recipe)
+
+    @action(detail=True, methods=['put'],
+            serializer_class=RecipeImageSerializer,
+            parser_classes=(MultiPartParser, FormParser))
+    def image(self, request, pk):
+        """Заменяет иллюстрацию к рецепту файлом, загруженным в формате
+        multipart/form-data, без кодирования в base64.
+        """
+        serializer = self.get_serializer(self.get_object(), data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.create_renditions(serializer)
+        bump_version(Recipe)
+        recipe = self.get_queryset().get(pk=serializer.instance.pk)
+        return Response(RecipeSerializer(
+            recipe, context=self.get_serializer_context()
+        ).data)
 
     @action(detail=True, methods=['post', 'delete'],
             serializer_class=RecipeShoppingCartSerializer)
@@ -158,16 +473,236 @@ class RecipeViewSet(ModelViewSet, UserSetActionMixin):
         """Выполняет операции с избранным пользователя."""
         return self.add_remove(request, pk)
 
+    @action(detail=False, methods=['get'],
+            serializer_class=PantryRecipeSerializer)
+    def pantry(self, request):
+        """Выполняет операцию 'Что приготовить': возвращает рецепты,
+        содержащие хотя бы один из ингредиентов, заданных параметрами have
+        строки запроса, в порядке убывания доли ингредиентов рецепта,
+        которые есть у пользователя. Остальные фильтры рецептов также
+        применяются.
+        """
+        ingredient_ids = get_ids(request.query_params, 'have')
+        if not ingredient_ids:
+            return Response(
+                dict(errors='Укажите id имеющихся ингредиентов в параметрах '
+                     'have.'),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = filter_pantry(
+            self.filter_queryset(self.get_queryset()), ingredient_ids
+        )
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], filter_by_tags=False)
+    def facets(self, request):
+        """Выполняет операцию 'Количество рецептов по тегам': для каждого
+        тега возвращает количество рецептов, удовлетворяющих остальным
+        фильтрам. Результат кэшируется до изменения данных рецептов или
+        тегов; запросы с фильтрами по спискам пользователя не кэшируются.
+        """
+        if any(
+            name in self.user_set_models for name in request.query_params
+        ):
+            return Response(self.count_facets())
+
+        key = self.get_facets_cache_key(request)
+        facets = cache.get(key)
+        if facets is None:
+            facets = self.count_facets()
+            cache.set(key, facets, settings.FACETS_CACHE_TIMEOUT)
+
+        return Response(facets)
+
+    def get_facets_cache_key(self, request):
+        """Возвращает ключ кэша для количества рецептов по тегам с учётом
+        параметров фильтрации и версий данных рецептов и тегов.
+        """
+        query = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in self.facets_ignored_params
+        )
+        signature = md5(repr(query).encode()).hexdigest()
+        return (
+            f'facets:{signature}:{get_version(Recipe)}:{get_version(Tag)}'
+        )
+
+    def count_facets(self):
+        """Подсчитывает рецепты, удовлетворяющие фильтрам, по тегам одним
+        запросом с группировкой.
+        """
+        recipes = self.filter_queryset(Recipe.objects.all())
+        counts = dict(
+            Recipe.tags.through.objects.filter(
+                recipe__in=recipes.values('pk')
+            ).values('tag').annotate(count=Count('pk')).values_list(
+                'tag', 'count'
+            )
+        )
+        return [
+            dict(id=tag.pk, name=tag.name, slug=tag.slug,
+                 count=counts.get(tag.pk, 0))
+            for tag in Tag.objects.all()
+        ]
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        """Выполняет операцию 'Похожие рецепты': возвращает рецепты с
+        наиболее близким набором ингредиентов в порядке убывания сходства.
+        Количество рецептов задаётся параметром limit строки запроса.
+        """
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        similar_ids = RecipeSimilarityBand.find_similar(
+            recipe, self.get_similar_limit()
+        )
+        recipes = self.get_queryset().in_bulk(similar_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in similar_ids if pk in recipes], many=True
+        )
+        return Response(serializer.data)
+
+    def get_similar_limit(self):
+        """Возвращает количество похожих рецептов, заданное параметром limit
+        строки запроса, но не более SIMILAR_RECIPES_LIMIT.
+        """
+        limit = self.request.query_params.get('limit', '')
+        if re.fullmatch(r'\d+', limit) and int(limit) > 0:
+            return min(int(limit), SIMILAR_RECIPES_LIMIT)
+
+        return SIMILAR_RECIPES_LIMIT
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated], ordering=FEED_ORDERING)
+    def feed(self, request):
+        """Выполняет операцию 'Лента подписок': возвращает рецепты авторов,
+        на которых подписан пользователь, начиная с последних. Страница
+        выбирается из ленты пользователя по курсору, после чего рецепты
+        загружаются одним запросом.
+        """
+        paginator = self.keyset_pagination_class()
+        items = paginator.paginate_queryset(
+            request.user.feed_items.all(), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in items]
+        )
+        serializer = self.get_serializer(
+            [
+                recipes[item.recipe_id] for item in items
+                if item.recipe_id in recipes
+            ],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='shopping_cart/bulk',
+            url_name='shopping-cart-bulk-add',
+            serializer_class=RecipeIdsSerializer,
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk_add(self, request):
+        """Включает в список покупок рецепты из заданного списка id."""
+        return self.bulk_add(request, RecipeInShoppingCart)
+
+    @action(detail=False, methods=['delete'], url_path='shopping_cart',
+            url_name='shopping-cart-bulk-remove',
+            serializer_class=RecipeIdsSerializer,
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk_remove(self, request):
+        """Исключает из списка покупок рецепты из заданного списка id, а
+        если список не задан - очищает список покупок.
+        """
+        return self.bulk_remove(request, RecipeInShoppingCart)
+
+    @action(detail=False, methods=['post'], url_path='favorite/bulk',
+            url_name='favorite-bulk-add',
+            serializer_class=RecipeIdsSerializer,
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk_add(self, request):
+        """Включает в избранное рецепты из заданного списка id."""
+        return self.bulk_add(request, RecipeInFavorites)
+
+    @action(detail=False, methods=['delete'], url_path='favorite',
+            url_name='favorite-bulk-remove',
+            serializer_class=RecipeIdsSerializer,
+            permission_classes=[IsAuthenticated])
+    def favorite_bulk_remove(self, request):
+        """Исключает из избранного рецепты из заданного списка id, а если
+        список не задан - очищает избранное.
+        """
+        return self.bulk_remove(request, RecipeInFavorites)
+
+    def bulk_add(self, request, set_model):
+        """Включает в набор пользователя рецепты из списка id, переданного
+        в теле запроса, одним запросом INSERT. Возвращает результат для
+        каждого id: added, already_added или not_found.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        with transaction.atomic():
+            existing = set(
+                Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+            )
+            added = set_model.add(
+                request.user, [pk for pk in ids if pk in existing]
+            )
+
+        return Response(dict(results=[
+            dict(
+                id=pk,
+                status=(
+                    'added' if pk in added
+                    else 'already_added' if pk in existing
+                    else 'not_found'
+                )
+            )
+            for pk in ids
+        ]))
+
+    def bulk_remove(self, request, set_model):
+        """Исключает из набора пользователя рецепты из списка id,
+        переданного в теле запроса, одним запросом DELETE; если список не
+        передан, очищает набор. Возвращает результат для каждого id:
+        removed или not_found.
+        """
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data.get('ids')
+        removed = set_model.remove(request.user, ids)
+        return Response(dict(results=[
+            dict(id=pk, status='removed' if pk in removed else 'not_found')
+            for pk in (sorted(removed) if ids is None else ids)
+        ]))
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        """Выполненяет операцию 'Скачать список покупок'."""
-        return HttpResponse(
-            get_shopping_cart_txt(request.user),
+        """Выполненяет операцию 'Скачать список покупок'. Формат файла
+        задаётся параметром type строки запроса: txt (по умолчанию), csv
+        или json.
+        """
+        format = request.query_params.get('type', ShoppingCart.default_format)
+        if format not in ShoppingCart.formats:
+            return Response(
+                dict(
+                    errors='Неизвестный формат списка покупок. '
+                    f'Допустимые форматы: {", ".join(ShoppingCart.formats)}.'
+                ),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cart = ShoppingCart(request.user)
+        return StreamingHttpResponse(
+            cart.iter_format(format),
             headers={
-                'Content-Type': 'text/plain; charset=utf-8',
+                'Content-Type': cart.get_content_type(format),
                 'Content-Disposition':
                     'attachment; '
-                    f'filename="shopping_cart_{request.user.id}.txt"',
+                    f'filename="shopping_cart_{request.user.id}.{format}"',
             }
         )
@@ -112,10 +112,55 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'core.paginators.Pagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.paginators.CachedCountPagination',
     'PAGE_SIZE': 10,
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    }
+}
+
+RESPONSE_CACHE = 'default'
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_APPROXIMATE_COUNT_THRESHOLD = os.getenv(
+    'PAGINATION_APPROXIMATE_COUNT_THRESHOLD'
+)
+PAGINATION_APPROXIMATE_COUNT_THRESHOLD = (
+    int(PAGINATION_APPROXIMATE_COUNT_THRESHOLD)
+    if PAGINATION_APPROXIMATE_COUNT_THRESHOLD else None
+)
+
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSION = 8000
+IMAGE_UPLOAD_SPOOL_SIZE = 1024 * 1024
+IMAGE_RENDITION_INLINE_MAX_PIXELS = 4 * 1024 * 1024
+
+RECIPE_BULK_MAX_IDS = 500
+
+FEED_MAX_ITEMS = 1000
+
+SIMILAR_RECIPES_CACHE_TIMEOUT = 60 * 60
+
+FACETS_CACHE_TIMEOUT = 5 * 60
+
+CATALOG_CACHE_MAX_AGE = 24 * 60 * 60
+
+RECIPE_TAGS_MASK = os.getenv('RECIPE_TAGS_MASK', 'False') == 'True'
+TAG_IDS_CACHE_TIMEOUT = 24 * 60 * 60
+
+INGREDIENT_SEARCH_INDEX = os.getenv('INGREDIENT_SEARCH_INDEX', 'True') == 'True'
+INGREDIENT_SEARCH_LIMIT = 50
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.UserSerializer',
@@ -0,0 +1,34 @@
+"""Содержит файловый бэкенд кэша с атомарной операцией add()."""
+import os
+import tempfile
+
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Файловый бэкенд кэша, в котором add() атомарен для всех процессов,
+    использующих папку кэша: запись создаётся жёсткой ссылкой на
+    временный файл, а создание ссылки завершается ошибкой, если файл
+    записи уже существует. Стандартный бэкенд проверяет наличие записи и
+    записывает её отдельными операциями, поэтому add() нескольких
+    процессов может завершиться успешно для каждого из них.
+    """
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version):
+            return False
+
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as file:
+                self._write_content(file, timeout, value)
+            os.link(tmp_path, fname)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+        return True
@@ -0,0 +1,85 @@
+"""Содержит примесь, реализующую условные GET-запросы к обработчикам DRF."""
+from hashlib import md5
+
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Возвращает строгий ETag, вычисленный по заданным значениям."""
+    return quote_etag(md5(repr(parts).encode()).hexdigest())
+
+
+class NotModified(Exception):
+    """Прерывает обработку запроса, когда ресурс не изменился."""
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Примесь к набору обработчиков, добавляющая к ответам на GET-запросы
+    заголовки ETag и Last-Modified и отвечающая кодом 304 на условные
+    запросы, если ресурс не изменился. Значения заголовков вычисляются
+    методами get_etag() и get_last_modified() до обращения к сериализатору,
+    поэтому они должны быть дешёвыми.
+    """
+    conditional_actions = ('list', 'retrieve')
+    cache_control = dict(no_cache=True)
+    vary_headers = ()
+
+    def get_etag(self, request):
+        """Возвращает ETag ресурса или None."""
+        return None
+
+    def get_last_modified(self, request):
+        """Возвращает время последнего изменения ресурса или None."""
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        self.conditional_headers = {}
+        return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in ('GET', 'HEAD')
+            and self.action in self.conditional_actions
+        ):
+            etag = self.get_etag(request)
+            last_modified = self.get_last_modified(request)
+            self.conditional_headers = dict(
+                etag=etag,
+                last_modified=(
+                    int(last_modified.timestamp()) if last_modified
+                    else None
+                ),
+            )
+            response = get_conditional_response(
+                request, **self.conditional_headers
+            )
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.conditional_headers and response.status_code in (200, 304):
+            etag = self.conditional_headers['etag']
+            last_modified = self.conditional_headers['last_modified']
+            if etag:
+                response.headers['ETag'] = etag
+            if last_modified:
+                response.headers['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, **self.cache_control)
+            patch_vary_headers(response, self.vary_headers)
+
+        return response
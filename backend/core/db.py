@@ -0,0 +1,86 @@
+"""Содержит функции для выполнения запросов к БД, которые нельзя выразить
+средствами ORM Django.
+"""
+from django.db import NotSupportedError, connections, router
+
+
+def get_connection(model):
+    """Возвращает соединение с БД для записи в таблицу модели. Соединение
+    должно поддерживать предложение RETURNING (PostgreSQL, SQLite 3.35+).
+    """
+    connection = connections[router.db_for_write(model)]
+    if not connection.features.can_return_columns_from_insert:
+        raise NotSupportedError(
+            f'{connection.display_name} не поддерживает RETURNING.'
+        )
+
+    return connection
+
+
+def execute_returning(connection, sql, params):
+    """Выполняет запрос и возвращает список значений первого столбца."""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def insert_ignore(model, rows, returning='id'):
+    """Вставляет в таблицу модели строки, заданные словарями вида
+    {имя поля: значение} с одинаковым набором ключей, одним запросом
+    INSERT ... ON CONFLICT DO NOTHING. Строки, нарушающие ограничения
+    уникальности, пропускаются. Возвращает список значений поля returning
+    вставленных строк.
+    """
+    if not rows:
+        return []
+
+    connection = get_connection(model)
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    placeholders = f'({", ".join(["%s"] * len(fields))})'
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([placeholders] * len(rows))} '
+        f'ON CONFLICT DO NOTHING RETURNING '
+        f'{quote(model._meta.get_field(returning).column)}'
+    )
+    params = [
+        field.get_db_prep_save(row[field.name], connection)
+        for row in rows for field in fields
+    ]
+    return execute_returning(connection, sql, params)
+
+
+def delete_returning(model, returning='id', **filters):
+    """Удаляет из таблицы модели строки, отобранные условиями вида
+    имя поля=значение или имя поля=список значений, одним запросом
+    DELETE ... RETURNING. Возвращает список значений поля returning
+    удалённых строк. Каскадное удаление средствами Django и сигналы не
+    выполняются.
+    """
+    connection = get_connection(model)
+    quote = connection.ops.quote_name
+    conditions, params = [], []
+    for name, value in filters.items():
+        field = model._meta.get_field(name)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            if not value:
+                return []
+
+            conditions.append(
+                f'{quote(field.column)} IN ({", ".join(["%s"] * len(value))})'
+            )
+            params.extend(
+                field.get_db_prep_value(item, connection) for item in value
+            )
+        else:
+            conditions.append(f'{quote(field.column)} = %s')
+            params.append(field.get_db_prep_value(value, connection))
+
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {" AND ".join(conditions) or "1 = 1"} '
+        f'RETURNING {quote(model._meta.get_field(returning).column)}'
+    )
+    return execute_returning(connection, sql, params)
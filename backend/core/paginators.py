@@ -1,7 +1,311 @@
 """Содержит пажинаторы, используемые другими приложениями."""
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+from functools import partial
+from hashlib import md5
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator
+)
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.versions import get_version
 
 
 class Pagination(PageNumberPagination):
     """Стандартный пажинатор для всего сайта."""
     page_size_query_param = 'limit'
+
+
+def estimate_count(queryset):
+    """Возвращает оценку количества объектов в кверисете, полученную от
+    планировщика запросов PostgreSQL, или None, если оценка недоступна.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CachedCountPage(Page):
+    """Страница, наличие следующей страницы у которой определено по
+    выборке, а не по количеству объектов.
+    """
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.next_exists = has_next
+
+    def has_next(self):
+        return self.next_exists
+
+
+class CachedCountPaginator(Paginator):
+    """Пажинатор Django, кэширующий количество объектов. Ключ кэша
+    включает текст SQL-запроса без аннотаций и сортировки, то есть
+    применённые фильтры, и версию данных, от которых зависит количество
+    (по умолчанию - версию данных модели), поэтому при изменении данных
+    прежние значения перестают использоваться.
+
+    Если задан порог PAGINATION_APPROXIMATE_COUNT_THRESHOLD и оценка
+    планировщика PostgreSQL его превышает, вместо точного подсчёта
+    используется эта оценка.
+
+    Количество может быть устаревшим или приближённым, поэтому оно
+    используется только для вывода: страница выбирается по размеру
+    страницы, а наличие следующей страницы определяется выборкой одного
+    лишнего объекта.
+    """
+    def __init__(self, object_list, per_page, version=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.version = version
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        try:
+            sql, params = queryset.order_by().values(
+                'pk'
+            ).query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+
+        signature = md5(f'{sql}{params!r}'.encode()).hexdigest()
+        version = self.version or get_version(queryset.model)
+        key = f'count:{signature}:{version}'
+        count = cache.get(key)
+        if count is None:
+            count = self.get_count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+
+        return count
+
+    def get_count(self):
+        """Подсчитывает количество объектов, при возможности приближённо.
+        """
+        threshold = settings.PAGINATION_APPROXIMATE_COUNT_THRESHOLD
+        if threshold is not None:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate > threshold:
+                return estimate
+
+        return self.object_list.count()
+
+    def validate_number(self, number):
+        """Проверяет номер страницы без сравнения с количеством страниц."""
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом.')
+
+        if number < 1:
+            raise EmptyPage('Номер страницы должен быть больше нуля.')
+
+        return number
+
+    def page(self, number):
+        """Возвращает страницу с заданным номером, выбирая на один объект
+        больше размера страницы.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('Страница не содержит объектов.')
+
+        return CachedCountPage(
+            objects[:self.per_page], number, self,
+            has_next=len(objects) > self.per_page
+        )
+
+
+class CachedCountPagination(Pagination):
+    """Пажинатор, кэширующий общее количество объектов. Используется по
+    умолчанию для всего сайта. Если у обработчика есть метод
+    get_count_version(), количество кэшируется с возвращаемой им версией
+    данных.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        version = (
+            view.get_count_version()
+            if hasattr(view, 'get_count_version') else None
+        )
+        self.django_paginator_class = partial(
+            CachedCountPaginator, version=version
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """Пажинатор, выбирающий страницы по значениям ключа сортировки
+    (keyset pagination) вместо номера страницы. Не выполняет подсчёт
+    общего количества объектов, а стоимость выборки страницы не зависит от
+    её удалённости от начала списка.
+
+    Ключ сортировки задаётся атрибутом ordering обработчика; он должен
+    однозначно упорядочивать объекты, например ('-pub_date', '-id').
+    Позиция в списке передаётся в параметре cursor строки запроса в
+    непрозрачном виде.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = tuple(view.ordering)
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        ordering = (
+            tuple(map(self.invert, self.ordering)) if reverse
+            else self.ordering
+        )
+        if position is not None:
+            queryset = queryset.filter(self.get_after_filter(
+                ordering, position
+            ))
+
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(dict(
+            next=self.get_next_link(),
+            previous=self.get_previous_link(),
+            results=data,
+        ))
+
+    def get_paginated_response_schema(self, schema):
+        return dict(
+            type='object',
+            properties=dict(
+                next=dict(type='string', nullable=True, format='uri'),
+                previous=dict(type='string', nullable=True, format='uri'),
+                results=schema,
+            ),
+        )
+
+    def get_page_size(self, request):
+        """Возвращает размер страницы, заданный параметром limit строки
+        запроса, или размер страницы по умолчанию.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return page_size if page_size > 0 else self.page_size
+
+    def get_next_link(self):
+        """Возвращает ссылку на следующую страницу."""
+        if not self.has_next or not self.page:
+            return None
+
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        """Возвращает ссылку на предыдущую страницу."""
+        if not self.has_previous:
+            return None
+
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_link(self, obj, reverse):
+        """Возвращает ссылку на страницу, примыкающую к заданному объекту
+        в заданном направлении.
+        """
+        position = [
+            obj._meta.get_field(self.field_name(field)).value_to_string(obj)
+            for field in self.ordering
+        ]
+        cursor = urlsafe_b64encode(
+            json.dumps(dict(p=position, r=reverse)).encode()
+        ).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request, model):
+        """Возвращает позицию, заданную курсором из строки запроса, и
+        направление выборки.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(self.field_name(field)).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(cursor['r'])
+        except (
+            binascii.Error, ValueError, KeyError, TypeError, ValidationError
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def field_name(field):
+        """Возвращает имя поля из элемента ключа сортировки."""
+        return field.lstrip('-')
+
+    @staticmethod
+    def invert(field):
+        """Возвращает элемент ключа сортировки с обратным направлением."""
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_after_filter(self, ordering, position):
+        """Возвращает условие отбора объектов, следующих за заданной
+        позицией при заданной сортировке.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = self.field_name(field)
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+
+        return condition
@@ -0,0 +1,101 @@
+"""Содержит функции и примесь, ограничивающие набор столбцов, загружаемых
+из БД, полями, которые нужны сериализатору.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def get_source_columns(model, source_attrs, field, select_related):
+    """Возвращает пути полей модели, необходимых для получения значения
+    поля сериализатора по цепочке атрибутов source_attrs. Связанные
+    объекты учитываются, только если они загружаются через select_related;
+    иначе загружается лишь внешний ключ.
+    """
+    name, *rest = source_attrs
+    if name == 'pk':
+        name = model._meta.pk.name
+
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return []
+
+    if not model_field.concrete or model_field.many_to_many:
+        return []
+
+    if not model_field.is_relation:
+        return [name]
+
+    related = (
+        select_related if select_related is True
+        else select_related.get(name) if isinstance(select_related, dict)
+        else None
+    )
+    if related is None:
+        return [name]
+
+    related_model = model_field.related_model
+    if rest:
+        nested = get_source_columns(related_model, rest, field, related)
+    elif isinstance(field, BaseSerializer):
+        nested = get_columns(field, related_model, related)
+    else:
+        nested = []
+
+    return [name, *(f'{name}__{column}' for column in nested)]
+
+
+def get_columns(serializer, model, select_related=False):
+    """Возвращает пути полей модели, необходимых сериализатору для
+    представления её объектов, в виде, пригодном для QuerySet.only().
+    Потребности сериализатора определяются объявленными в нём полями:
+    поля, не являющиеся полями модели (аннотации, методы), не требуют
+    столбцов, а списки связанных объектов загружаются отдельно.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+
+    columns = [model._meta.pk.name]
+    for field in serializer.fields.values():
+        if not field.write_only and field.source_attrs:
+            columns.extend(get_source_columns(
+                model, field.source_attrs, field, select_related
+            ))
+
+    return list(dict.fromkeys(columns))
+
+
+def project(queryset, serializer, *fields):
+    """Ограничивает загружаемые столбцы кверисета полями, необходимыми
+    сериализатору, и дополнительно заданными полями (например, внешним
+    ключом, по которому сопоставляются объекты при prefetch_related).
+    """
+    return queryset.only(
+        *get_columns(
+            serializer, queryset.model, queryset.query.select_related
+        ),
+        *fields
+    )
+
+
+class ProjectionMixin:
+    """Примесь к набору обработчиков, позволяющая загружать из БД только
+    столбцы, необходимые сериализатору действия. Применяется в действиях
+    из projection_actions: при изменении объектов нужны все их поля.
+    """
+    projection_actions = ('list', 'retrieve')
+    projection_fields = ()
+
+    def project(self, queryset):
+        """Ограничивает загружаемые столбцы кверисета, если это допустимо
+        для текущего действия. Поля projection_fields загружаются всегда.
+        """
+        if self.action not in self.projection_actions:
+            return queryset
+
+        return project(
+            queryset, self.get_serializer(), *self.projection_fields
+        )
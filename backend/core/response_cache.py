@@ -0,0 +1,119 @@
+"""Содержит примесь, кэширующую ответы обработчиков DRF анонимным
+пользователям.
+"""
+from hashlib import md5
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from core.versions import get_version
+
+
+class AnonymousResponseCacheMixin:
+    """Примесь к набору обработчиков, кэширующая данные ответов на
+    запросы анонимных пользователей. Ключ кэша составляется из пути,
+    нормализованных параметров строки запроса и версии данных моделей
+    response_cache_models, входящих в ответы; после изменения данных
+    прежние записи перестают использоваться.
+
+    Чтобы при отсутствии записи в кэше одновременные запросы не
+    обращались к БД все сразу, данные вычисляет только один из них, а
+    остальные ждут появления записи (single-flight). Для этого операция
+    add() бэкенда кэша должна быть атомарной.
+    """
+    response_cache_actions = ('list', 'retrieve')
+    response_cache_key_prefix = 'response'
+    response_cache_models = NotImplemented
+
+    def get_response_cache_version(self):
+        """Возвращает версию данных, от которых зависят ответы: версии
+        данных моделей response_cache_models.
+        """
+        return '-'.join(
+            str(get_version(model)) for model in self.response_cache_models
+        )
+
+    def get_response_cache_key(self, request):
+        """Возвращает ключ кэша для ответа на заданный запрос."""
+        query = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        signature = md5(
+            repr((request.get_host(), request.path, query)).encode()
+        ).hexdigest()
+        return (
+            f'{self.response_cache_key_prefix}:{signature}:'
+            f'{self.get_response_cache_version()}'
+        )
+
+    def is_response_cacheable(self, request):
+        """Возвращает True, если ответ на запрос можно кэшировать."""
+        return (
+            request.method == 'GET'
+            and self.action in self.response_cache_actions
+            and not request.user.is_authenticated
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        """Возвращает ответ, построенный по данным из кэша, или вызывает
+        обработчик и сохраняет данные его ответа в кэше.
+        """
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        cache = caches[settings.RESPONSE_CACHE]
+        key = self.get_response_cache_key(request)
+        lock_key = f'{key}:lock'
+        cached = cache.get(key)
+        locked = False
+        if cached is None:
+            locked = cache.add(
+                lock_key, True, settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            )
+            if not locked:
+                cached = self.wait_for_response(cache, key)
+
+        if cached is not None:
+            data, status = cached
+            return Response(data, status=status)
+
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key, (response.data, response.status_code),
+                    settings.RESPONSE_CACHE_TIMEOUT
+                )
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+        return response
+
+    @staticmethod
+    def wait_for_response(cache, key):
+        """Ожидает появления в кэше данных ответа, вычисляемых другим
+        запросом. Возвращает их или None, если тот запрос завершился, не
+        сохранив данных, либо истекло время ожидания.
+        """
+        deadline = monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        while monotonic() < deadline:
+            sleep(settings.RESPONSE_CACHE_POLL_INTERVAL)
+            cached = cache.get(key)
+            if cached is not None or not cache.has_key(f'{key}:lock'):
+                return cached
+
+        return None
@@ -0,0 +1,38 @@
+"""Содержит функции для работы с версиями данных. Версия - метка
+времени в наносекундах, хранящаяся в кэше и обновляемая при каждом
+изменении соответствующих данных. Включение версии в ключи кэша делает
+устаревшие записи недоступными без их явного удаления; кроме того, версия
+служит временем последнего изменения данных.
+"""
+from datetime import datetime, timezone
+from time import time_ns
+
+from django.core.cache import cache
+
+VERSION_KEY_PREFIX = 'data-version'
+
+
+def get_version_key(model):
+    """Возвращает ключ кэша для версии данных заданной модели."""
+    return f'{VERSION_KEY_PREFIX}:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Возвращает текущую версию данных заданной модели."""
+    return cache.get_or_set(get_version_key(model), time_ns, timeout=None)
+
+
+def get_modified(model):
+    """Возвращает время последнего изменения данных заданной модели."""
+    return datetime.fromtimestamp(
+        get_version(model) // 1_000_000_000, tz=timezone.utc
+    )
+
+
+def bump_version(*models):
+    """Обновляет версии данных заданных моделей."""
+    for model in models:
+        key = get_version_key(model)
+        cache.set(
+            key, max(time_ns(), cache.get(key, 0) + 1), timeout=None
+        )
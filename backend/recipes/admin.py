@@ -40,21 +40,24 @@ class IngredientOccurenceInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Настройки отображения модели Recipe в административной панели."""
-    readonly_fields = ('in_favor_count',)
+    readonly_fields = ('favorites_count',)
     exclude = ('in_favorites', 'in_shopping_cart')
     inlines = (IngredientOccurenceInline,)
-    list_display = ('name', 'author_name')
+    list_display = ('name', 'author_name', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
+    list_select_related = ('author',)
 
     @admin.display(description='Автор')
     def author_name(self, recipe):
         """Возвращает имя пользователя автора рецепта."""
         return recipe.author.username
 
-    @admin.display(description='Количество добавлений в избранное')
-    def in_favor_count(self, recipe):
-        """Возвращает количество добавлений рецепта в избранное."""
-        return recipe.in_favorites.count()
+    def save_related(self, request, form, formsets, change):
+        """Сохраняет связанные объекты рецепта и пересчитывает данные для
+        поиска похожих рецептов.
+        """
+        super().save_related(request, form, formsets, change)
+        form.instance.update_similarity_index()
 
 
 @admin.register(RecipeInFavorites)
@@ -5,4 +5,14 @@ TAG_COLOR_CODE_REGEXP = r'\A#[0-9a-fA-F]{6}\Z'
 MAX_INGREDIENT_NAME_LENGTH = 150
 MAX_INGREDIENT_MEASUREMENT_UNIT_LENGTH = 20
 MAX_RECIPE_NAME_LENGTH = 200
-RECIPES_ORDERING = ('-pub_date',)  # ['id']  #
+RECIPES_ORDERING = ('-pub_date', '-id')
+RECIPE_IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_THUMBNAIL_WIDTH = 320
+SIMILARITY_SIGNATURE_SIZE = 32
+SIMILARITY_BAND_SIZE = 2
+SIMILARITY_SEED = 20231018
+SIMILARITY_CANDIDATES_LIMIT = 200
+SIMILAR_RECIPES_LIMIT = 10
+TAGS_MASK_SIZE = 63
+SEARCH_CONFIG = 'russian'
+SEARCH_FTS_WEIGHTS = (10.0, 1.0)
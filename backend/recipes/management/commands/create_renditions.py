@@ -0,0 +1,72 @@
+"""Содержит django-admin команду для создания уменьшенных копий
+иллюстраций к существующим рецептам.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.renditions import create_renditions
+
+
+def process(name, force):
+    """Создаёт варианты изображения с заданным именем. Выполняется в
+    дочернем процессе. Возвращает количество созданных вариантов или
+    текст ошибки.
+    """
+    try:
+        return create_renditions(Recipe(image=name).image, force=force)
+    except (OSError, Image.DecompressionBombError) as error:
+        return str(error)
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для создания вариантов иллюстраций.
+    """
+    help = (
+        'Создаёт уменьшенные копии иллюстраций к рецептам в форматах JPEG '
+        'и WebP. Уже созданные копии пропускаются, если не указан ключ '
+        '--force.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов (по умолчанию - по числу ядер).'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие копии.'
+        )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        names = list(
+            Recipe.objects.exclude(image='').order_by('image').values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        connections.close_all()
+        created = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=django.setup
+        ) as executor:
+            results = executor.map(
+                process, names, [options['force']] * len(names),
+                chunksize=16
+            )
+            for name, result in zip(names, results):
+                if isinstance(result, str):
+                    failed += 1
+                    self.stderr.write(f'{name}: {result}')
+                else:
+                    created += result
+
+        return (
+            f'Обработано иллюстраций: {len(names)}, создано копий: '
+            f'{created}, ошибок: {failed}.'
+        )
@@ -1,13 +1,88 @@
 """Содержит django-admin команду для загрузки ингредиентов в БД."""
-from django.core.management.base import BaseCommand
-from rest_framework.parsers import JSONParser
+import csv
+from itertools import islice
+import json
+import os
+from time import monotonic
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.versions import bump_version
+from recipes.models import Ingredient
 from recipes.serializers import IngredientSerializer
 
+READ_SIZE = 64 * 1024
+
+
+class IngredientRowSerializer(IngredientSerializer):
+    """Сериализатор для проверки строк файла с ингредиентами. Не проверяет
+    уникальность ингредиента: уже существующие ингредиенты пропускаются при
+    записи в БД.
+    """
+    class Meta(IngredientSerializer.Meta):
+        fields = ('name', 'measurement_unit')
+        validators = ()
+
+
+def skip_separators(buffer, position):
+    """Возвращает позицию первого символа, не являющегося пробельным
+    символом или запятой.
+    """
+    while position < len(buffer) and buffer[position] in ' \t\r\n,':
+        position += 1
+
+    return position
+
+
+def iter_json(file):
+    """Последовательно возвращает элементы массива JSON из файла, не
+    загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('файл должен содержать массив JSON.')
+
+    position = 1
+    eof = False
+    while True:
+        position = skip_separators(buffer, position)
+        if buffer[position:position + 1] == ']':
+            return
+
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError('некорректный JSON в конце файла.')
+
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield item
+
+
+def iter_csv(file):
+    """Последовательно возвращает строки файла CSV без заголовка в виде
+    словарей.
+    """
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(('name', 'measurement_unit'), row))
+
 
 class Command(BaseCommand):
     """Определяет django-admin команду для загрузки ингредиентов в БД."""
-    help = 'Загружает ингредиенты в БД из файла в формате JSON.'
+    help = (
+        'Загружает ингредиенты в БД из файла в формате JSON или CSV. '
+        'Уже существующие в БД ингредиенты пропускаются, поэтому команду '
+        'можно запускать повторно.'
+    )
+    readers = dict(json=iter_json, csv=iter_csv)
 
     def add_arguments(self, parser):
         """Определяет аргументы команды."""
@@ -15,19 +90,84 @@ class Command(BaseCommand):
             'file_name', metavar='<file name>',
             help='Имя файла с ингредиентами.'
         )
+        parser.add_argument(
+            '--format', choices=tuple(self.readers),
+            help='Формат файла (по умолчанию - по расширению имени файла).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество ингредиентов, записываемых в БД за один запрос.'
+        )
 
     def handle(self, *args, **options):
         """Выполняет команду"""
         file_name = options['file_name']
+        format = options['format'] or os.path.splitext(
+            file_name
+        )[1].lstrip('.').lower()
+        if format not in self.readers:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите его ключом '
+                '--format.'
+            )
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть положительным.')
+
+        count_before = Ingredient.objects.count()
+        started_at = monotonic()
+        processed = invalid = 0
         try:
-            with open(file_name, 'rb') as file:
-                data = JSONParser().parse(file)
-        except Exception as e:
-            return f'Ошибка: {e}'
+            with open(file_name, encoding='utf-8', newline='') as file:
+                rows = self.readers[format](file)
+                while batch := list(islice(rows, batch_size)):
+                    invalid += self.load_batch(batch, processed)
+                    processed += len(batch)
+                    self.report_progress(processed, started_at)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Ошибка: {error}')
+        finally:
+            bump_version(Ingredient)
+
+        added = Ingredient.objects.count() - count_before
+        return (
+            f'Загрузка завершена. Обработано строк: {processed}, добавлено '
+            f'ингредиентов: {added}, некорректных строк: {invalid}.'
+        )
 
-        serializer = IngredientSerializer(data=data, many=True)
+    def load_batch(self, batch, offset):
+        """Проверяет пакет строк и записывает корректные ингредиенты в БД.
+        Возвращает количество некорректных строк.
+        """
+        serializer = IngredientRowSerializer(data=batch, many=True)
         if serializer.is_valid():
-            serializer.save()
-            return 'Загрузка выполнена успешно.'
+            rows = serializer.validated_data
+        else:
+            rows = []
+            for number, (data, errors) in enumerate(
+                zip(batch, serializer.errors), offset + 1
+            ):
+                if errors:
+                    self.stderr.write(f'Строка {number}: {data!r}: {errors}')
+                else:
+                    rows.append(serializer.child.run_validation(data))
 
-        return f'Файл содержит некорректные данные:\n{serializer.errors}'
+        ingredients = {
+            (row['name'], row['measurement_unit']): Ingredient(**row)
+            for row in rows
+        }
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                ingredients.values(), ignore_conflicts=True
+            )
+
+        return len(batch) - len(rows)
+
+    def report_progress(self, processed, started_at):
+        """Выводит количество обработанных строк и скорость загрузки."""
+        elapsed = monotonic() - started_at
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано строк: {processed} ({rate:.0f} строк/с)'
+        )
@@ -0,0 +1,27 @@
+"""Содержит django-admin команду для перестроения данных полнотекстового
+поиска рецептов.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import clear_search_index, update_search_index
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для перестроения данных
+    полнотекстового поиска рецептов.
+    """
+    help = (
+        'Пересчитывает данные полнотекстового поиска по названию и '
+        'описанию всех рецептов.'
+    )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        recipes = Recipe.objects.all()
+        with transaction.atomic():
+            clear_search_index(recipes.db)
+            update_search_index(recipes)
+
+        return f'Обработано рецептов: {recipes.count()}.'
@@ -0,0 +1,49 @@
+"""Содержит django-admin команду для перестроения данных поиска похожих
+рецептов.
+"""
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import IngredientOccurence, RecipeSimilarityBand
+from recipes.similarity import get_bands, get_signature
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для перестроения полос сигнатур
+    рецептов.
+    """
+    help = (
+        'Пересчитывает сигнатуры наборов ингредиентов всех рецептов, '
+        'используемые для поиска похожих рецептов.'
+    )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        occurences = IngredientOccurence.objects.order_by(
+            'recipe', 'ingredient'
+        ).values_list('recipe', 'ingredient').iterator(chunk_size=BATCH_SIZE)
+        recipes = 0
+        with transaction.atomic():
+            RecipeSimilarityBand.objects.all().delete()
+            batch = []
+            for recipe_id, rows in groupby(occurences, key=lambda row: row[0]):
+                batch.extend(
+                    RecipeSimilarityBand(
+                        recipe_id=recipe_id, number=number, hash=hash
+                    )
+                    for number, hash in get_bands(get_signature(
+                        ingredient_id for _, ingredient_id in rows
+                    ))
+                )
+                recipes += 1
+                if len(batch) >= BATCH_SIZE:
+                    RecipeSimilarityBand.objects.bulk_create(batch)
+                    batch = []
+
+            RecipeSimilarityBand.objects.bulk_create(batch)
+
+        return f'Обработано рецептов: {recipes}.'
@@ -0,0 +1,71 @@
+"""Содержит django-admin команду для пересчёта счётчиков рецептов и
+пользователей.
+"""
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, RecipeInFavorites, RecipeInShoppingCart
+from users.models import Subscription
+
+
+def count_by(model, field):
+    """Возвращает выражение, подсчитывающее объекты заданной модели,
+    у которых заданное поле ссылается на текущий объект внешнего запроса.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(count=Count('pk')).values('count')
+        ),
+        Value(0)
+    )
+
+
+def fix_counters(queryset, counters):
+    """Записывает в счётчики объектов кверисета их фактические значения,
+    заданные словарём {имя счётчика: выражение}. Обновляются только
+    объекты, у которых значения разошлись. Возвращает количество
+    обновлённых объектов.
+    """
+    drifted = queryset.annotate(
+        **{f'actual_{name}': value for name, value in counters.items()}
+    ).filter(
+        reduce(
+            or_, (~Q(**{name: F(f'actual_{name}')}) for name in counters)
+        )
+    ).values_list('pk', flat=True)
+    return queryset.model.objects.filter(pk__in=drifted).update(
+        **counters
+    )
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для пересчёта счётчиков."""
+    help = (
+        'Пересчитывает счётчики добавлений рецептов в избранное и в список '
+        'покупок, а также счётчики рецептов и подписчиков пользователей.'
+    )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        with transaction.atomic():
+            recipes = fix_counters(Recipe.objects.all(), dict(
+                favorites_count=count_by(RecipeInFavorites, 'recipe'),
+                shopping_cart_count=count_by(RecipeInShoppingCart, 'recipe'),
+            ))
+            users = fix_counters(get_user_model().objects.all(), dict(
+                recipes_count=count_by(Recipe, 'author'),
+                subscribers_count=count_by(Subscription, 'subscribed_to'),
+            ))
+
+        return (
+            f'Исправлены счётчики рецептов: {recipes}, '
+            f'пользователей: {users}.'
+        )
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.4 on 2026-10-18 20:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSimilarityBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField(verbose_name='Номер полосы')),
+                ('hash', models.BigIntegerField(verbose_name='Хеш полосы')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_bands', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'полоса сигнатуры рецепта',
+                'verbose_name_plural': 'полосы сигнатур рецептов',
+                'indexes': [models.Index(fields=['number', 'hash'], name='similarity_band_hash_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesimilarityband',
+            constraint=models.UniqueConstraint(fields=('recipe', 'number'), name='unique_similarity_band'),
+        ),
+    ]
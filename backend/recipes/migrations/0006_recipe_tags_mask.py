@@ -0,0 +1,40 @@
+# Generated by Django 4.2.4 on 2026-10-18 20:43
+
+from django.db import migrations, models
+
+TAGS_MASK_SIZE = 63
+
+
+def fill_tags_masks(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    masks = {}
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        tag_id__lte=TAGS_MASK_SIZE
+    ).values_list('recipe_id', 'tag_id').iterator():
+        masks[recipe_id] = masks.get(recipe_id, 0) | 1 << (tag_id - 1)
+
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ('tags_mask',), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_similarity_band'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
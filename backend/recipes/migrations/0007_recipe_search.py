@@ -0,0 +1,59 @@
+# Generated by Django 4.2.4 on 2026-10-18 20:49
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"UPDATE recipes_recipe SET search_vector = "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', text), 'B');"
+        )
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector);'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            f"name, text, tokenize='unicode61 remove_diacritics 2');"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, name, text FROM recipes_recipe;'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX recipe_search_vector_idx;')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Используется для полнотекстового поиска в PostgreSQL.', null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Обновляется обработчиком изменения тегов рецепта.', verbose_name='Битовая маска тегов'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,10 +1,24 @@
 """Содержит модели, используемые приложением recipes."""
+from collections import defaultdict
+from functools import reduce
+from hashlib import md5
+from operator import or_
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.core.validators import RegexValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.db.models.constraints import UniqueConstraint
 
+from core.db import delete_returning, insert_ignore
+from core.versions import bump_version
 from recipes import constants
+from recipes.search import update_search_index
+from recipes.similarity import get_bands, get_signature, jaccard
+from users.models import FeedItem
 
 
 class Tag(models.Model):
@@ -27,6 +41,16 @@ class Tag(models.Model):
         verbose_name = 'тег'
         verbose_name_plural = 'теги'
 
+    @staticmethod
+    def get_bit(tag_id):
+        """Возвращает бит тега с заданным id в битовой маске тегов рецепта
+        или 0, если тег в маске не представлен.
+        """
+        if 0 < tag_id <= constants.TAGS_MASK_SIZE:
+            return 1 << (tag_id - 1)
+
+        return 0
+
     def __str__(self):
         return f'{self.name}'
 
@@ -59,6 +83,7 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Модель рецепта."""
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    modified = models.DateTimeField('Дата изменения', auto_now=True)
     name = models.CharField(
         'Название', max_length=constants.MAX_RECIPE_NAME_LENGTH
     )
@@ -95,15 +120,65 @@ class Recipe(models.Model):
         verbose_name='В списке покупок у пользователей',
         blank=True,
     )
+    tags_mask = models.BigIntegerField(
+        'Битовая маска тегов', default=0, editable=False,
+        help_text='Обновляется обработчиком изменения тегов рецепта.'
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False,
+        help_text='Используется для полнотекстового поиска в PostgreSQL.'
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное', default=0, editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Количество добавлений в список покупок', default=0, editable=False
+    )
 
     class Meta:
         ordering = constants.RECIPES_ORDERING
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = (
+            models.Index(
+                fields=constants.RECIPES_ORDERING, name='recipe_ordering_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', *constants.RECIPES_ORDERING),
+                name='recipe_popularity_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        """Сохраняет рецепт. При создании рецепта увеличивает счётчик
+        рецептов его автора и добавляет рецепт в ленты подписчиков автора.
+        При изменении названия или описания обновляет данные поиска.
+        """
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            self.update_author_recipes_count(1)
+            FeedItem.fan_out(self)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'text'} & set(update_fields):
+            update_search_index(Recipe.objects.filter(pk=self.pk))
+
+    def update_author_recipes_count(self, delta):
+        """Изменяет счётчик рецептов автора на заданную величину."""
+        get_user_model().objects.filter(pk=self.author_id).update(
+            recipes_count=F('recipes_count') + delta
+        )
+
+    def update_counter(self, counter_name, delta):
+        """Изменяет заданный счётчик рецепта на заданную величину."""
+        Recipe.objects.filter(pk=self.pk).update(
+            **{counter_name: F(counter_name) + delta}
+        )
+
     def add_ingredients(self, ingredient, amount=None):
         """Добавляет ингредиенты в рецепт."""
         if isinstance(ingredient, Ingredient):
@@ -120,13 +195,118 @@ class Recipe(models.Model):
             for occurence in occurences
         )
 
+    def set_ingredients(self, occurences):
+        """Устанавливает набор ингредиентов рецепта. Изменяет только
+        отличающиеся вхождения: новые добавляются одним запросом INSERT,
+        изменившиеся количества обновляются одним запросом UPDATE, а
+        исключённые ингредиенты удаляются одним запросом DELETE.
+        """
+        amounts = {
+            occurence['ingredient'].pk: occurence for occurence in occurences
+        }
+        existing = {
+            occurence.ingredient_id: occurence
+            for occurence in self.ingredients.all()
+        }
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            IngredientOccurence.objects.filter(
+                recipe=self, ingredient_id__in=removed
+            ).delete()
+
+        changed = []
+        for pk, occurence in existing.items():
+            if pk in amounts and occurence.amount != amounts[pk]['amount']:
+                occurence.amount = amounts[pk]['amount']
+                changed.append(occurence)
+
+        if changed:
+            IngredientOccurence.objects.bulk_update(changed, ('amount',))
+
+        self.add_ingredients(
+            occurence for pk, occurence in amounts.items()
+            if pk not in existing
+        )
+        if removed or amounts.keys() - existing.keys():
+            self.update_similarity_index(amounts.keys())
+
+    def update_similarity_index(self, ingredient_ids=None):
+        """Пересчитывает полосы сигнатуры набора ингредиентов рецепта,
+        используемые для поиска похожих рецептов. Если набор id
+        ингредиентов не задан, он загружается из БД.
+        """
+        if ingredient_ids is None:
+            ingredient_ids = self.ingredients.values_list(
+                'ingredient', flat=True
+            )
+
+        RecipeSimilarityBand.objects.filter(recipe=self).delete()
+        RecipeSimilarityBand.objects.bulk_create(
+            RecipeSimilarityBand(recipe=self, number=number, hash=hash)
+            for number, hash in get_bands(get_signature(ingredient_ids))
+        )
+
     def set_tags(self, tags):
         """Устанавливает набор тегов для рецепта."""
         self.tags.set(tags)
 
 
-class RecipeInFavorites(models.Model):
+class RecipeUserSetItem:
+    """Примесь к моделям вхождения рецепта в набор (список) пользователя.
+    Добавление и исключение выполняются одним запросом к таблице набора
+    независимо от его размера, а повторные и одновременные операции не
+    приводят к ошибкам: результат определяется по затронутым строкам.
+    Сигналы при этом не отправляются, поэтому версию данных наборов
+    обновляют сами операции.
+    """
+    counter_name = NotImplemented
+
+    @classmethod
+    @transaction.atomic
+    def add(cls, user, recipe_ids):
+        """Добавляет рецепты с заданными id в набор пользователя. Возвращает
+        множество id рецептов, которых в наборе ещё не было.
+        """
+        added = set(insert_ignore(
+            cls,
+            [dict(recipe=recipe_id, user=user.pk) for recipe_id in recipe_ids],
+            returning='recipe',
+        ))
+        cls.update_counters(added, 1)
+        return added
+
+    @classmethod
+    @transaction.atomic
+    def remove(cls, user, recipe_ids=None):
+        """Исключает рецепты с заданными id из набора пользователя, а если
+        они не заданы - очищает набор. Возвращает множество id рецептов,
+        которые были в наборе.
+        """
+        filters = dict(user=user.pk)
+        if recipe_ids is not None:
+            filters['recipe'] = list(recipe_ids)
+
+        removed = set(delete_returning(cls, returning='recipe', **filters))
+        cls.update_counters(removed, -1)
+        return removed
+
+    @classmethod
+    def update_counters(cls, recipe_ids, delta):
+        """Изменяет счётчик набора у заданных рецептов на заданную
+        величину и после фиксации транзакции обновляет версию данных
+        наборов этого вида.
+        """
+        if recipe_ids:
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                **{cls.counter_name: F(cls.counter_name) + delta}
+            )
+            transaction.on_commit(lambda: bump_version(cls))
+
+
+class RecipeInFavorites(RecipeUserSetItem, models.Model):
     """Модель, представляющая вхождение рецепта в избранное."""
+    counter_name = 'favorites_count'
+
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
@@ -152,8 +332,10 @@ class RecipeInFavorites(models.Model):
         return f'{self.recipe} в избранном у {self.user}'
 
 
-class RecipeInShoppingCart(models.Model):
+class RecipeInShoppingCart(RecipeUserSetItem, models.Model):
     """Модель, представляющая вхождение рецепта в список покупок."""
+    counter_name = 'shopping_cart_count'
+
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
@@ -179,6 +361,93 @@ class RecipeInShoppingCart(models.Model):
         return f'{self.recipe} в корзине у {self.user}'
 
 
+class RecipeSimilarityBand(models.Model):
+    """Модель, представляющая полосу сигнатуры MinHash набора ингредиентов
+    рецепта. Рецепты, у которых совпадает хеш хотя бы одной полосы с тем же
+    номером, считаются кандидатами в похожие.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarity_bands',
+        verbose_name='Рецепт',
+    )
+    number = models.PositiveSmallIntegerField('Номер полосы')
+    hash = models.BigIntegerField('Хеш полосы')
+
+    class Meta:
+        verbose_name = 'полоса сигнатуры рецепта'
+        verbose_name_plural = 'полосы сигнатур рецептов'
+        constraints = (
+            UniqueConstraint(
+                fields=('recipe', 'number'),
+                name='unique_similarity_band'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('number', 'hash'), name='similarity_band_hash_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'Полоса {self.number} рецепта {self.recipe}'
+
+    @classmethod
+    def find_similar(cls, recipe, limit=constants.SIMILAR_RECIPES_LIMIT):
+        """Возвращает список id рецептов, наиболее похожих на заданный по
+        набору ингредиентов, в порядке убывания сходства. Кандидаты
+        отбираются по совпадающим полосам сигнатур, после чего
+        упорядочиваются по точному коэффициенту Жаккара.
+
+        Результат кэшируется; ключ кэша включает хеши полос рецепта, поэтому
+        при изменении набора его ингредиентов прежний результат перестаёт
+        использоваться. Изменения других рецептов учитываются по истечении
+        SIMILAR_RECIPES_CACHE_TIMEOUT.
+        """
+        bands = list(cls.objects.filter(recipe=recipe).order_by(
+            'number'
+        ).values_list('number', 'hash'))
+        if not bands:
+            return []
+
+        signature = md5(repr(bands).encode()).hexdigest()
+        key = f'similar:{recipe.pk}:{signature}:{limit}'
+        similar = cache.get(key)
+        if similar is None:
+            similar = cls.rank_candidates(recipe, bands, limit)
+            cache.set(key, similar, settings.SIMILAR_RECIPES_CACHE_TIMEOUT)
+
+        return similar
+
+    @classmethod
+    def rank_candidates(cls, recipe, bands, limit):
+        """Отбирает рецепты с совпадающими полосами и возвращает список id
+        не более чем limit из них в порядке убывания сходства.
+        """
+        candidates = dict(cls.objects.filter(
+            reduce(or_, (
+                models.Q(number=number, hash=hash) for number, hash in bands
+            ))
+        ).exclude(recipe=recipe).values('recipe').annotate(
+            matches=models.Count('pk')
+        ).order_by('-matches', '-recipe').values_list(
+            'recipe', 'matches'
+        )[:constants.SIMILARITY_CANDIDATES_LIMIT])
+        ingredients = defaultdict(set)
+        for recipe_id, ingredient_id in IngredientOccurence.objects.filter(
+            recipe__in=[recipe.pk, *candidates]
+        ).order_by().values_list('recipe', 'ingredient'):
+            ingredients[recipe_id].add(ingredient_id)
+
+        own = ingredients[recipe.pk]
+        return sorted(
+            candidates,
+            key=lambda pk: (jaccard(own, ingredients[pk]), candidates[pk], pk),
+            reverse=True
+        )[:limit]
+
+
 class IngredientOccurence(models.Model):
     """Модель, представляющая вхождение ингредиента в рецепт."""
     amount = models.PositiveSmallIntegerField(
@@ -0,0 +1,122 @@
+"""Содержит функции для создания уменьшенных копий (вариантов)
+иллюстраций к рецептам. Для каждой ширины из
+RECIPE_IMAGE_RENDITION_WIDTHS создаются вариант в формате JPEG и вариант
+в формате WebP. Варианты хранятся рядом с оригиналом, а их имена
+вычисляются по имени оригинала, поэтому не требуют хранения в БД.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from recipes import constants
+
+RENDITION_FORMATS = dict(jpg='JPEG', webp='WEBP')
+RENDITION_QUALITY = 80
+
+
+def get_rendition_name(name, width, extension):
+    """Возвращает имя файла варианта изображения заданной ширины в
+    формате с заданным расширением. Имя оригинала сохраняется целиком,
+    вместе с расширением: хранилище обеспечивает уникальность только
+    полных имён, и у оригиналов в разных форматах (recipe.png и
+    recipe.jpeg) варианты иначе совпали бы.
+    """
+    return f'{name}.{width}w.{extension}'
+
+
+def get_rendition_names(name):
+    """Возвращает имена всех вариантов изображения."""
+    return [
+        get_rendition_name(name, width, extension)
+        for width in constants.RECIPE_IMAGE_RENDITION_WIDTHS
+        for extension in RENDITION_FORMATS
+    ]
+
+
+def flatten(image):
+    """Возвращает изображение в режиме RGB, накладывая прозрачные
+    изображения на белый фон.
+    """
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+
+    return image.convert('RGB')
+
+
+def render(image, width, format):
+    """Возвращает содержимое варианта изображения заданной ширины в
+    заданном формате. Изображения уже заданной ширины не увеличиваются.
+    """
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format, quality=RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def create_renditions(image, force=True, max_pixels=None):
+    """Создаёт варианты изображения из поля ImageField. Если force равно
+    False, уже существующие варианты не пересоздаются.
+
+    JPEG уменьшается уже при декодировании, но так, чтобы обе его стороны
+    оставались не меньше наибольшей ширины варианта: после поворота по
+    EXIF ширина может стать высотой. Если задано max_pixels, а
+    изображение после такого уменьшения содержит больше пикселей,
+    варианты не создаются. Возвращает количество созданных вариантов.
+    """
+    storage, name = image.storage, image.name
+    pending = [
+        (width, extension)
+        for width in constants.RECIPE_IMAGE_RENDITION_WIDTHS
+        for extension in RENDITION_FORMATS
+        if force or not storage.exists(
+            get_rendition_name(name, width, extension)
+        )
+    ]
+    if not pending:
+        return 0
+
+    with storage.open(name) as file, Image.open(file) as original:
+        width = max(constants.RECIPE_IMAGE_RENDITION_WIDTHS)
+        original.draft('RGB', (width, width))
+        if max_pixels and original.width * original.height > max_pixels:
+            return 0
+
+        source = flatten(ImageOps.exif_transpose(original))
+
+    for width, extension in pending:
+        rendition_name = get_rendition_name(name, width, extension)
+        if storage.exists(rendition_name):
+            storage.delete(rendition_name)
+
+        storage.save(rendition_name, ContentFile(
+            render(source, width, RENDITION_FORMATS[extension])
+        ))
+
+    image.renditions_exist = True
+    return len(pending)
+
+
+def has_renditions(image):
+    """Возвращает True, если варианты изображения уже созданы. Варианты
+    создаются вместе, поэтому проверяется только последний из них.
+    Результат запоминается в объекте файла, чтобы поля, представляющие
+    разные варианты, не обращались к хранилищу повторно.
+    """
+    if not hasattr(image, 'renditions_exist'):
+        image.renditions_exist = image.storage.exists(
+            get_rendition_names(image.name)[-1]
+        )
+
+    return image.renditions_exist
+
+
+def get_rendition_url(image, width, extension):
+    """Возвращает URL варианта изображения заданной ширины."""
+    return image.storage.url(get_rendition_name(image.name, width, extension))
@@ -0,0 +1,128 @@
+"""Содержит функции полнотекстового поиска рецептов по названию и
+описанию. В PostgreSQL поиск выполняется по столбцу search_vector рецепта
+типа tsvector (конфигурация для русского языка, GIN-индекс), в SQLite - по
+виртуальной таблице FTS5 с тем же содержимым. Для остальных СУБД поиск не
+поддерживается и не находит рецептов.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connections
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+
+from recipes import constants
+
+FTS_TABLE = 'recipes_recipe_search'
+
+
+def get_search_vector():
+    """Возвращает выражение для расчёта поискового вектора рецепта.
+    Слова названия имеют больший вес, чем слова описания.
+    """
+    return (
+        SearchVector('name', weight='A', config=constants.SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=constants.SEARCH_CONFIG)
+    )
+
+
+def get_fts_query(text):
+    """Преобразует строку поиска в запрос FTS5: рецепт должен содержать
+    слова, начинающиеся с каждого из слов строки.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+class FTSRank(Func):
+    """Выражение, возвращающее релевантность рецепта запросу FTS5. Чем
+    больше значение, тем выше релевантность.
+    """
+    output_field = FloatField()
+
+    def __init__(self, query):
+        super().__init__(Value(query), F('pk'))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        query, pk = self.get_source_expressions()
+        query_sql, query_params = compiler.compile(query)
+        pk_sql, pk_params = compiler.compile(pk)
+        weights = ', '.join(map(str, constants.SEARCH_FTS_WEIGHTS))
+        return (
+            f'(SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH {query_sql} '
+            f'AND {FTS_TABLE}.rowid = {pk_sql})',
+            (*query_params, *pk_params)
+        )
+
+
+def search_recipes(queryset, text):
+    """Отбирает рецепты, соответствующие строке поиска, и аннотирует их
+    релевантностью (аннотация search_rank).
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=constants.SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+
+    query = get_fts_query(text)
+    if vendor != 'sqlite' or not query:
+        return queryset.annotate(
+            search_rank=Value(0, output_field=FloatField())
+        ).none()
+
+    return queryset.filter(
+        pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (query,)
+        )
+    ).annotate(search_rank=FTSRank(query))
+
+
+def update_search_index(recipes):
+    """Пересчитывает данные поиска для рецептов заданного кверисета."""
+    connection = connections[recipes.db]
+    if connection.vendor == 'postgresql':
+        recipes.update(search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        recipes = recipes.order_by()
+        sql, params = recipes.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({sql})', params
+            )
+            sql, params = recipes.values_list(
+                'pk', 'name', 'text'
+            ).query.sql_with_params()
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) {sql}', params
+            )
+
+
+def remove_from_search_index(recipe_ids, using):
+    """Удаляет данные поиска рецептов с заданными id. В PostgreSQL они
+    удаляются вместе с рецептами.
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and recipe_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(recipe_ids))})',
+                recipe_ids
+            )
+
+
+def clear_search_index(using):
+    """Удаляет данные поиска всех рецептов. В PostgreSQL не требуется:
+    пересчёт заменяет поисковые векторы всех рецептов.
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
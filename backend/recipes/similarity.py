@@ -0,0 +1,69 @@
+"""Содержит функции для оценки сходства рецептов по набору ингредиентов.
+Сходство наборов измеряется коэффициентом Жаккара. Для быстрого отбора
+кандидатов каждому набору сопоставляется сигнатура MinHash, разбитая на
+полосы (LSH): наборы, у которых совпадает хотя бы одна полоса, с высокой
+вероятностью близки, а далёкие наборы почти никогда не совпадают ни в
+одной полосе.
+"""
+from hashlib import blake2b
+import random
+
+from recipes import constants
+
+PRIME = (1 << 61) - 1
+
+
+def make_hash_coefficients():
+    """Возвращает коэффициенты хеш-функций вида (a * x + b) mod PRIME,
+    одинаковые во всех процессах.
+    """
+    generator = random.Random(constants.SIMILARITY_SEED)
+    return tuple(
+        (generator.randrange(1, PRIME), generator.randrange(PRIME))
+        for _ in range(constants.SIMILARITY_SIGNATURE_SIZE)
+    )
+
+
+HASH_COEFFICIENTS = make_hash_coefficients()
+
+
+def get_signature(ingredient_ids):
+    """Возвращает сигнатуру MinHash набора id ингредиентов или пустой
+    кортеж для пустого набора.
+    """
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return ()
+
+    return tuple(
+        min((a * pk + b) % PRIME for pk in ingredient_ids)
+        for a, b in HASH_COEFFICIENTS
+    )
+
+
+def get_bands(signature):
+    """Возвращает список пар (номер полосы, хеш полосы) сигнатуры. Хеш
+    помещается в знаковое 64-битное целое.
+    """
+    size = constants.SIMILARITY_BAND_SIZE
+    return [
+        (
+            number,
+            int.from_bytes(
+                blake2b(
+                    repr(signature[start:start + size]).encode(),
+                    digest_size=8
+                ).digest(),
+                'big', signed=True
+            ),
+        )
+        for number, start in enumerate(range(0, len(signature), size))
+    ]
+
+
+def jaccard(first, second):
+    """Возвращает коэффициент Жаккара двух множеств."""
+    if not first and not second:
+        return 0.0
+
+    return len(first & second) / len(first | second)
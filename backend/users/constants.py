@@ -2,3 +2,5 @@
 MAX_PASSWORD_LENGTH = 150
 MAX_FIRST_NAME_LENGTH = 150
 MAX_LAST_NAME_LENGTH = 150
+FEED_ORDERING = ('-pub_date', '-recipe')
+FEED_BATCH_SIZE = 1000
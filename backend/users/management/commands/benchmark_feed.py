@@ -0,0 +1,91 @@
+"""Содержит django-admin команду для сравнения скорости чтения ленты
+пользователя и выборки рецептов его подписок при чтении.
+"""
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from rest_framework.settings import api_settings
+
+from recipes.constants import RECIPES_ORDERING
+from recipes.models import Recipe
+from users.constants import FEED_ORDERING
+from users.models import FeedItem, User
+
+
+def read_feed(user, limit):
+    """Возвращает id рецептов первой страницы ленты пользователя."""
+    return list(
+        FeedItem.objects.filter(user=user).order_by(
+            *FEED_ORDERING
+        ).values_list('recipe', flat=True)[:limit]
+    )
+
+
+def read_subscriptions(user, limit):
+    """Возвращает id последних рецептов авторов, на которых подписан
+    пользователь, выбирая их из таблицы рецептов (fan-out on read).
+    """
+    return list(
+        Recipe.objects.filter(
+            author__subscriptions_to__user=user
+        ).order_by(*RECIPES_ORDERING).values_list('pk', flat=True)[:limit]
+    )
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для сравнения способов чтения ленты.
+    """
+    help = (
+        'Сравнивает время выборки первой страницы ленты из таблицы лент и '
+        'из таблицы рецептов для пользователей с наибольшим числом подписок.'
+    )
+    readers = dict(feed=read_feed, subscriptions=read_subscriptions)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Количество пользователей.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help='Количество повторов выборки для каждого пользователя.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=api_settings.PAGE_SIZE,
+            help='Размер страницы.'
+        )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        users = list(User.objects.annotate(
+            subscriptions=Count('subscriptions_of')
+        ).filter(subscriptions__gt=0).order_by(
+            '-subscriptions'
+        )[:options['users']])
+        if not users:
+            return 'Нет пользователей с подписками.'
+
+        timings = {name: [] for name in self.readers}
+        mismatches = 0
+        for user in users:
+            results = {}
+            for name, reader in self.readers.items():
+                for _ in range(options['repeat']):
+                    started_at = perf_counter()
+                    results[name] = reader(user, options['limit'])
+                    timings[name].append(perf_counter() - started_at)
+
+            mismatches += results['feed'] != results['subscriptions']
+
+        for name, values in timings.items():
+            self.stdout.write(
+                f'{name}: медиана {median(values) * 1000:.3f} мс, '
+                f'максимум {max(values) * 1000:.3f} мс'
+            )
+
+        return (
+            f'Пользователей: {len(users)}, расхождений между способами: '
+            f'{mismatches}.'
+        )
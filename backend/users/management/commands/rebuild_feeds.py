@@ -0,0 +1,40 @@
+"""Содержит django-admin команду для перестроения лент пользователей."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import FeedItem, Subscription
+
+
+class Command(BaseCommand):
+    """Определяет django-admin команду для перестроения лент."""
+    help = (
+        'Добавляет в ленты пользователей рецепты авторов, на которых они '
+        'подписаны, и удаляет из лент рецепты сверх допустимого количества.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune-only', action='store_true',
+            help='Только удалить из лент лишние рецепты.'
+        )
+
+    def handle(self, *args, **options):
+        """Выполняет команду"""
+        with transaction.atomic():
+            subscriptions = 0
+            if not options['prune_only']:
+                for subscription in Subscription.objects.select_related(
+                    'user', 'subscribed_to'
+                ).iterator():
+                    FeedItem.backfill(
+                        subscription.user, subscription.subscribed_to,
+                        prune=False
+                    )
+                    subscriptions += 1
+
+            pruned = FeedItem.prune()
+
+        return (
+            f'Обработано подписок: {subscriptions}, удалено лишних записей: '
+            f'{pruned}.'
+        )
@@ -1,8 +1,14 @@
 """Содержит модели, используемые приложением users."""
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.db.models.constraints import UniqueConstraint
 from django.contrib.auth.models import AbstractUser
 
+from core.db import insert_ignore
+from core.versions import bump_version
+from recipes.constants import RECIPES_ORDERING
 from users import constants
 
 
@@ -33,6 +39,12 @@ class User(AbstractUser):
         verbose_name='Подписки',
         blank=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
@@ -49,19 +61,55 @@ class User(AbstractUser):
         """Возвращает True, если пользователь подписан на заданного
         автора.
         """
-        return author in self.subscribed_to.all()
+        return self.subscriptions_of.filter(subscribed_to=author).exists()
 
+    @transaction.atomic
     def subscribe_to(self, author):
-        """Подписывает пользователя на заданного автора."""
-        self.subscribed_to.add(author)
+        """Подписывает пользователя на заданного автора. Возвращает True,
+        если подписка была создана.
+        """
+        if not insert_ignore(
+            Subscription, [dict(user=self.pk, subscribed_to=author.pk)]
+        ):
+            return False
 
+        author.update_counter('subscribers_count', 1)
+        FeedItem.backfill(self, author)
+        transaction.on_commit(lambda: bump_version(Subscription))
+        return True
+
+    @transaction.atomic
     def unsubscribe_from(self, author):
-        """Отписывает пользователя от заданного автора."""
-        self.subscribed_to.remove(author)
+        """Отписывает пользователя от заданного автора. Возвращает True,
+        если подписка была удалена.
+        """
+        deleted, _ = self.subscriptions_of.filter(
+            subscribed_to=author
+        ).delete()
+        if not deleted:
+            return False
 
+        author.update_counter('subscribers_count', -1)
+        self.feed_items.filter(recipe__author=author).delete()
+        transaction.on_commit(lambda: bump_version(Subscription))
+        return True
+
+    def update_counter(self, counter_name, delta):
+        """Изменяет заданный счётчик пользователя на заданную величину."""
+        User.objects.filter(pk=self.pk).update(
+            **{counter_name: F(counter_name) + delta}
+        )
+
+    @transaction.atomic
     def set_subscriptions(self, authors):
-        """Задаёт множество подписок пользователя."""
+        """Задаёт множество подписок пользователя и перестраивает его ленту.
+        """
         self.subscribed_to.set(authors)
+        self.feed_items.all().delete()
+        for author in authors:
+            FeedItem.backfill(self, author, prune=False)
+
+        FeedItem.prune((self.pk,))
 
 
 class Subscription(models.Model):
@@ -91,3 +139,100 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.subscribed_to}'
+
+
+class FeedItem(models.Model):
+    """Модель, представляющая рецепт в ленте пользователя - списке рецептов
+    авторов, на которых он подписан. Лента заполняется при публикации
+    рецепта (fan-out on write) и при подписке, поэтому чтение ленты
+    сводится к просмотру диапазона индекса по пользователю. Дата публикации
+    рецепта дублируется, чтобы индекс задавал порядок ленты.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='feed_items',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        'recipes.Recipe',
+        related_name='feed_items',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'рецепт в ленте'
+        verbose_name_plural = 'рецепты в лентах'
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', *constants.FEED_ORDERING),
+                name='feed_item_ordering_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте у {self.user}'
+
+    @classmethod
+    def fan_out(cls, recipe):
+        """Добавляет рецепт в ленты подписчиков его автора. Ленты при этом
+        не сокращаются: рецепты сверх допустимого количества удаляет
+        команда rebuild_feeds --prune-only.
+        """
+        subscribers = Subscription.objects.filter(
+            subscribed_to=recipe.author_id
+        ).values_list('user', flat=True)
+        cls.objects.bulk_create(
+            (
+                cls(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+                for user_id in subscribers.iterator()
+            ),
+            batch_size=constants.FEED_BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    @classmethod
+    def backfill(cls, user, author, prune=True):
+        """Добавляет в ленту пользователя последние рецепты автора. Если
+        prune равно True, удаляет из ленты рецепты сверх допустимого
+        количества.
+        """
+        recipes = author.recipes.order_by(*RECIPES_ORDERING).values_list(
+            'pk', 'pub_date'
+        )[:settings.FEED_MAX_ITEMS]
+        cls.objects.bulk_create(
+            (
+                cls(user=user, recipe_id=recipe_id, pub_date=pub_date)
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=constants.FEED_BATCH_SIZE, ignore_conflicts=True,
+        )
+        if prune:
+            cls.prune((user.pk,))
+
+    @classmethod
+    def prune(cls, user_ids=None):
+        """Удаляет из лент заданных пользователей (по умолчанию - всех)
+        рецепты сверх FEED_MAX_ITEMS последних. Возвращает количество
+        удалённых записей.
+        """
+        items = cls.objects.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+
+        excess = items.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('user'),
+                order_by=constants.FEED_ORDERING,
+            )
+        ).filter(position__gt=settings.FEED_MAX_ITEMS).values('pk')
+        deleted, _ = cls.objects.filter(pk__in=excess).delete()
+        return deleted